@@ -1,33 +1,58 @@
 """
 Main App
+
+Startup is kept lean for uWSGI worker spawn and reload: Stripe, Mail and the
+Winit HTTP client are imported or set up on first use, and Flask-Migrate
+(which imports alembic) is only initialized outside uWSGI, where `flask db`
+and the migration scripts need it. bench_startup.py checks the budget.
 """
+import time
+_import_started = time.perf_counter()
 
 import os
 import logging
-import smtplib
 from logging.handlers import TimedRotatingFileHandler
-from flask import Flask, request, current_app
+from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from flask_bootstrap import Bootstrap
 from config import Config
-from flask_user.signals import user_sent_invitation, user_registered
+from .metrics import registry
 
 db = SQLAlchemy()
-migrate = Migrate()
-bootstrap = Bootstrap()
+
+APP_STARTUP = registry.histogram(
+    'app_startup_seconds', 'Time from importing the app package to the end of create_app')
+
+def _under_uwsgi():
+    try:
+        import uwsgi  # noqa: F401 - only importable inside uWSGI
+    except ImportError:
+        return False
+    return True
 
 def create_app(config_class=Config):
+    started = time.perf_counter()
     app = Flask(__name__, subdomain_matching=True)
     app.config.from_object(Config)
 
+    from . import db_pool
+    db_pool.init_app(app)
     db.init_app(app)
-    migrate.init_app(app)
-    bootstrap.init_app(app)
-    
-    # Import and initialize EmailService here to avoid circular imports
-    from .services.email_service import EmailService
-    email_service = EmailService(app)
+    if not _under_uwsgi():
+        from flask_migrate import Migrate
+        Migrate(app, db)
+
+    from . import replica
+    replica.init_app(app)
+
+    if app.config.get('STRIPE_API_BASE'):
+        import stripe
+        stripe.api_base = app.config['STRIPE_API_BASE']
+
+    from . import instrumentation, metrics, profiler, sql_profiler
+    instrumentation.init_app(app)
+    metrics.init_app(app)
+    sql_profiler.init_app(app)
+    profiler.init_app(app)
 
     from .blueprints.main import bp as main_bp
     app.register_blueprint(main_bp)
@@ -38,6 +63,9 @@ def create_app(config_class=Config):
     from .blueprints.checkout import bp as checkout_bp
     app.register_blueprint(checkout_bp, url_prefix='/checkout')
 
+    from .blueprints.metrics import bp as metrics_bp
+    app.register_blueprint(metrics_bp)
+
     if not app.debug and not app.testing:
         if not os.path.exists(app.config['LOG_DIR']):
             os.mkdir(app.config['LOG_DIR'])
@@ -47,6 +75,12 @@ def create_app(config_class=Config):
         file_handler.setLevel(logging.INFO)
         app.logger.addHandler(file_handler)
         app.logger.setLevel(logging.INFO)
-        app.logger.debug('Locoganga startup')
+
+    # The first app in a process also pays for importing the app package
+    global _import_started
+    elapsed = time.perf_counter() - (_import_started or started)
+    _import_started = None
+    APP_STARTUP.observe(elapsed)
+    app.logger.debug(f'Locoganga startup in {elapsed * 1000:.0f} ms')
 
     return app
@@ -1,10 +1,13 @@
 from flask import Blueprint, jsonify, session, request, render_template
-from ..models import CartItem, db
+from ..services.cart_service import CartService
 import hashlib
 from datetime import datetime
 
 bp = Blueprint('cart', __name__)
 
+# Upper bound on operations accepted by a single /cart/batch request
+MAX_BATCH_OPERATIONS = 100
+
 @bp.route('/add', methods=['POST'])
 def add_to_cart():
     if 'session_id' not in session:
@@ -16,25 +19,14 @@ def add_to_cart():
     if not sku:
         return jsonify({'error': 'SKU is required'}), 400
     
-    cart_item = CartItem.query.filter_by(
-        sku=sku,
-        session_id=session['session_id']
-    ).first()
-    
-    if cart_item:
-        cart_item.quantity += 1
-    else:
-        cart_item = CartItem(
-            sku=sku,
-            session_id=session['session_id'],
-            title=data.get('title'),
-            price=data.get('price'),
-            thumbnail=data.get('thumbnail'),
-            spu=data.get('spu')
-        )
-        db.session.add(cart_item)
-    
-    db.session.commit()
+    CartService().add_item(
+        session['session_id'],
+        sku,
+        title=data.get('title'),
+        price=data.get('price'),
+        thumbnail=data.get('thumbnail'),
+        spu=data.get('spu')
+    )
     return jsonify({'message': 'Added to cart'})
 
 @bp.route('/', methods=['GET'])
@@ -42,11 +34,15 @@ def view_cart():
     if 'session_id' not in session:
         return render_template('cart/cart.html', cart_items=[], total=0)
     
-    cart_items = CartItem.query.filter_by(session_id=session['session_id']).all()
+    cart_items = CartService().get_items(session['session_id'])
     total = sum(item.price * item.quantity for item in cart_items) if cart_items else 0
     
     return render_template('cart/cart.html', cart_items=cart_items, total=total)
 
+@bp.route('/summary', methods=['GET'])
+def cart_summary():
+    return jsonify(CartService().get_summary(session.get('session_id')))
+
 @bp.route('/update', methods=['POST'])
 def update_cart():
     if 'session_id' not in session:
@@ -54,20 +50,46 @@ def update_cart():
     
     data = request.json
     sku = data.get('sku')
-    change = data.get('change', 0)
     
     if not sku:
         return jsonify({'error': 'SKU is required'}), 400
+
+    try:
+        change = int(data.get('change', 0))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Change must be an integer'}), 400
     
-    cart_item = CartItem.query.filter_by(
-        sku=sku,
-        session_id=session['session_id']
-    ).first()
-    
-    if cart_item:
-        cart_item.quantity = max(0, cart_item.quantity + change)
-        if cart_item.quantity == 0:
-            db.session.delete(cart_item)
-        db.session.commit()
-        
-    return jsonify({'message': 'Cart updated'})
\ No newline at end of file
+    CartService().update_quantity(session['session_id'], sku, change)
+    return jsonify({'message': 'Cart updated'})
+
+@bp.route('/batch', methods=['POST'])
+def batch_update_cart():
+    if 'session_id' not in session:
+        return jsonify({'error': 'No session found'}), 400
+
+    data = request.json or {}
+    operations = data.get('operations')
+
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'Operations are required'}), 400
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({'error': f'At most {MAX_BATCH_OPERATIONS} operations per batch'}), 400
+
+    changes = []
+    for operation in operations:
+        if not isinstance(operation, dict) or not operation.get('sku'):
+            return jsonify({'error': 'SKU is required'}), 400
+        try:
+            changes.append((operation['sku'], int(operation.get('change', 0))))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Change must be an integer'}), 400
+
+    cart_service = CartService()
+    cart_service.apply_changes(session['session_id'], changes)
+
+    cart_items = cart_service.get_items(session['session_id'])
+    return jsonify({
+        'items': [item.to_dict() for item in cart_items],
+        'item_count': sum(item.quantity for item in cart_items),
+        'total': sum(item.price * item.quantity for item in cart_items)
+    })
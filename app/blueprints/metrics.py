@@ -0,0 +1,19 @@
+import hmac
+from flask import Blueprint, Response, current_app, request, abort
+from ..metrics import registry
+
+bp = Blueprint('metrics', __name__)
+
+@bp.route('/metrics')
+def metrics():
+    # Scrapers send METRICS_TOKEN as a bearer token. Without one the endpoint
+    # is only served in debug mode: behind a reverse proxy every request looks
+    # local, so the client address cannot stand in for the token.
+    token = current_app.config.get('METRICS_TOKEN')
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            abort(401)
+    elif not current_app.debug:
+        abort(403)
+
+    return Response(registry.render_prometheus(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,157 @@
+"""
+Connection pool settings and metrics for the SQLAlchemy engine
+
+Every uWSGI worker has its own pool, so the per-worker pool is sized from the
+connection budget (DB_MAX_CONNECTIONS) divided by the number of workers
+instead of a fixed size that multiplies with `processes`: half of a worker's
+share is kept open, the rest is overflow for spikes. The worker.py jobs
+attached to uWSGI run one query at a time, so each one that is switched on
+gets a fixed pool of DB_BACKGROUND_POOL_SIZE with no overflow, reserved out
+of the budget before the web workers split the rest. Connections are
+recycled before MySQL's idle timeout and pinged on checkout, so a worker that
+sat idle gets a fresh connection instead of "MySQL server has gone away".
+
+The pool reports how long a checkout waited for a connection, how many were
+checked out at that moment, timeouts, new connections and invalidations
+(pings that found a dead connection) to /metrics, so a pool running out shows
+up there before it shows up as latency. SQLite keeps Flask-SQLAlchemy's own
+pool defaults.
+"""
+import os
+import time
+import logging
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+from app.metrics import registry
+
+logger = logging.getLogger('db_pool')
+
+POOL_CHECKOUT_SECONDS = registry.histogram(
+    'db_pool_checkout_seconds', 'Time to get a connection from the pool, including opening one',
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+POOL_CHECKED_OUT = registry.histogram(
+    'db_pool_checked_out_connections', 'Connections in use in the worker, observed at each checkout',
+    buckets=(1, 2, 3, 4, 6, 8, 12, 16, 24, 32))
+POOL_TIMEOUTS = registry.counter(
+    'db_pool_timeouts_total', 'Checkouts that gave up waiting for a connection')
+POOL_CONNECTIONS = registry.counter(
+    'db_pool_connections_total', 'Database connections opened')
+POOL_INVALIDATED = registry.counter(
+    'db_pool_invalidated_total', 'Connections discarded as dead (failed ping or disconnect error)')
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records checkout waits, pool usage and timeouts"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            POOL_TIMEOUTS.inc()
+            logger.warning(f"Database pool exhausted ({self.status()})")
+            raise
+        finally:
+            POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - start)
+        POOL_CHECKED_OUT.observe(self.checkedout())
+        return connection
+
+@event.listens_for(InstrumentedQueuePool, 'connect')
+def _on_connect(dbapi_connection, connection_record):
+    POOL_CONNECTIONS.inc()
+
+@event.listens_for(InstrumentedQueuePool, 'invalidate')
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    POOL_INVALIDATED.inc()
+
+def worker_count():
+    """uWSGI worker processes sharing the connection budget (1 outside uWSGI)"""
+    try:
+        import uwsgi
+        return max(int(uwsgi.numproc), 1)
+    except (ImportError, AttributeError):
+        return max(int(os.environ.get('UWSGI_PROCESSES') or 1), 1)
+
+def worker_threads():
+    """Request threads per uWSGI worker (1 unless `threads` is set)"""
+    try:
+        import uwsgi
+        return max(int(uwsgi.opt.get('threads') or 1), 1)
+    except (ImportError, AttributeError, TypeError, ValueError):
+        return 1
+
+def background_processes(config):
+    """
+    worker.py jobs attached to uWSGI that hold a background pool (0 outside uWSGI)
+
+    Jobs whose WORKER_JOB_SWITCHES setting is off idle without connecting,
+    so they are not counted.
+    """
+    try:
+        import uwsgi
+        daemons = uwsgi.opt.get('attach-daemon') or []
+    except (ImportError, AttributeError):
+        return 0
+    if not isinstance(daemons, list):
+        daemons = [daemons]
+
+    switches = config.get('WORKER_JOB_SWITCHES') or {}
+    running = 0
+    for command in daemons:
+        words = (command.decode() if isinstance(command, bytes) else str(command)).split()
+        jobs = [job for script, job in zip(words, words[1:]) if script.endswith('worker.py')]
+        if not jobs:
+            continue
+        switch = switches.get(jobs[0])
+        if switch and not config.get(switch):
+            continue
+        running += 1
+    return running
+
+def engine_options(config, workers=None, threads=None, background=None):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS for this process
+
+    DB_POOL_SIZE and DB_MAX_OVERFLOW override the derived sizes of the web
+    workers. A background process (DB_POOL_BACKGROUND, set by worker.py)
+    always gets DB_BACKGROUND_POOL_SIZE connections and no overflow.
+
+    Returns:
+        dict: Engine options; empty for SQLite
+    """
+    uri = config.get('SQLALCHEMY_DATABASE_URI') or ''
+    if not uri or uri.startswith('sqlite'):
+        return {}
+
+    if background is None:
+        background = config.get('DB_POOL_BACKGROUND', False)
+    if background:
+        pool_size, max_overflow = config['DB_BACKGROUND_POOL_SIZE'], 0
+    else:
+        workers = workers or worker_count()
+        threads = threads or worker_threads()
+        budget = config['DB_MAX_CONNECTIONS'] - background_processes(config) * config['DB_BACKGROUND_POOL_SIZE']
+        # Every request thread can hold a connection; never go below that
+        share = max(budget // workers, threads + 1)
+        pool_size = config.get('DB_POOL_SIZE') or max(share // 2, threads)
+        max_overflow = config.get('DB_MAX_OVERFLOW')
+        if max_overflow is None:
+            max_overflow = max(share - pool_size, 0)
+
+    return {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+
+def init_app(app):
+    """Fill in SQLALCHEMY_ENGINE_OPTIONS; options set explicitly take priority"""
+    options = engine_options(app.config)
+    if options:
+        options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+        app.logger.debug(f"Database pool per worker: size {options['pool_size']}, "
+                         f"overflow {options['max_overflow']}")
@@ -0,0 +1,147 @@
+"""
+Per-request timing of the slow phases of a request
+
+When REQUEST_TIMING_ENABLED is set, every request records how long it spent
+in database queries, template rendering, Winit calls, Stripe calls and email
+sending. The totals go out as a Server-Timing response header (visible in the
+browser's network panel) and as one JSON record per request in the app log:
+
+    request_timing {"method": "GET", "path": "/", "status": 200, "total_ms": 412.3,
+                    "phases": {"winit": {"ms": 388.1, "count": 1}, "db": {...}}}
+
+Code around a slow call marks it with ``with timed('winit'):``. When timing
+is disabled no hooks are installed and timed() returns a shared no-op
+context manager after one flag check.
+"""
+import json
+import time
+from contextlib import nullcontext
+from flask import g, has_request_context, request, signals_available, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_enabled = False
+_noop = nullcontext()
+
+# Phases in Server-Timing order
+PHASES = ('db', 'template', 'winit', 'stripe', 'email')
+
+class _Phase:
+    """Adds the time spent inside the with-block to one phase of a RequestTimings"""
+
+    __slots__ = ('timings', 'name', 'start')
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timings.add(self.name, time.perf_counter() - self.start)
+        return False
+
+class RequestTimings:
+    """Accumulated seconds and call counts per phase for one request"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = {}
+
+    def add(self, name, seconds):
+        total, count = self.phases.get(name, (0.0, 0))
+        self.phases[name] = (total + seconds, count + 1)
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def server_timing(self, total):
+        """Server-Timing header value, durations in milliseconds"""
+        parts = []
+        for name in sorted(self.phases, key=lambda n: PHASES.index(n) if n in PHASES else len(PHASES)):
+            seconds, count = self.phases[name]
+            parts.append(f'{name};dur={seconds * 1000:.1f};desc="{count} call{"s" if count != 1 else ""}"')
+        parts.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(parts)
+
+    def record(self):
+        return {
+            name: {'ms': round(seconds * 1000, 1), 'count': count}
+            for name, (seconds, count) in self.phases.items()
+        }
+
+def current_timings():
+    """The RequestTimings of the current request, or None when not timing"""
+    if not _enabled or not has_request_context():
+        return None
+    return g.get('request_timings')
+
+def timed(phase):
+    """
+    Context manager adding the time spent in its block to a request phase
+
+    A no-op outside requests and when timing is disabled.
+    """
+    timings = current_timings()
+    if timings is None:
+        return _noop
+    return timings.phase(phase)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_timings() is not None:
+        conn.info.setdefault('request_timing_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = current_timings()
+    starts = conn.info.get('request_timing_start')
+    if timings is not None and starts:
+        timings.add('db', time.perf_counter() - starts.pop())
+
+def _before_render_template(app, template, context, **extra):
+    if current_timings() is not None:
+        g.setdefault('template_render_start', []).append(time.perf_counter())
+
+def _template_rendered(app, template, context, **extra):
+    timings = current_timings()
+    starts = g.get('template_render_start') if timings is not None else None
+    if starts:
+        timings.add('template', time.perf_counter() - starts.pop())
+
+def init_app(app):
+    """Install the timing hooks if REQUEST_TIMING_ENABLED is set"""
+    global _enabled
+    if not app.config.get('REQUEST_TIMING_ENABLED'):
+        return
+    _enabled = True
+
+    # Engine-class listeners cover every engine, including binds added later
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    if signals_available:
+        before_render_template.connect(_before_render_template, app)
+        template_rendered.connect(_template_rendered, app)
+
+    @app.before_request
+    def start_request_timing():
+        g.request_timings = RequestTimings()
+
+    @app.after_request
+    def finish_request_timing(response):
+        timings = g.pop('request_timings', None)
+        if timings is None:
+            return response
+        total = time.perf_counter() - timings.start
+        response.headers['Server-Timing'] = timings.server_timing(total)
+        app.logger.info('request_timing ' + json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'phases': timings.record()
+        }))
+        return response
@@ -0,0 +1,252 @@
+"""
+In-process metrics registry shared by the uWSGI workers through snapshot files
+
+Counters and histograms are plain dicts guarded by one uncontended lock, so
+recording a value costs a dict update. Every worker writes its values to
+METRICS_DIR/metrics-<pid>.json every METRICS_FLUSH_SECONDS from a background
+thread started on its first recorded value (and at exit, and inline when a
+value is recorded late, in case threads are disabled); the /metrics endpoint
+sums all the snapshots with the live values of the worker serving it and
+renders them in the Prometheus text format.
+"""
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+
+logger = logging.getLogger('metrics')
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+class Counter:
+    def __init__(self, registry, name, labelnames):
+        self.registry = registry
+        self.name = name
+        self.labelnames = labelnames
+
+    def inc(self, value=1, **labels):
+        self.registry._inc(self.name, tuple(labels[n] for n in self.labelnames), value)
+
+class Histogram:
+    def __init__(self, registry, name, labelnames, buckets):
+        self.registry = registry
+        self.name = name
+        self.labelnames = labelnames
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        self.registry._observe(self.name, tuple(labels[n] for n in self.labelnames), value, self.buckets)
+
+class MetricsRegistry:
+    """Counters and histograms for one process, plus cross-process aggregation"""
+
+    def __init__(self):
+        self.directory = None
+        self.flush_interval = 5
+        self.stale_seconds = 3600
+        self._lock = threading.Lock()
+        self._meta = {}
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._counters = {}
+        self._histograms = {}
+        self._last_flush = time.monotonic()
+        self._flusher = None
+
+    def configure(self, directory=None, flush_interval=5, stale_seconds=3600):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.stale_seconds = stale_seconds
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def counter(self, name, documentation, labelnames=()):
+        self._meta[name] = ('counter', documentation, labelnames, None)
+        return Counter(self, name, tuple(labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self._meta[name] = ('histogram', documentation, labelnames, tuple(buckets))
+        return Histogram(self, name, tuple(labelnames), tuple(buckets))
+
+    def _check_fork(self):
+        # Values recorded before a fork belong to the parent, not to this worker
+        if self._pid != os.getpid():
+            self._reset()
+        if self._flusher is None and self.directory:
+            # Threads do not survive a fork, so each worker starts its own
+            if _in_uwsgi_master():
+                self._flusher = False
+            else:
+                self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+                self._flusher.start()
+
+    def _inc(self, name, labels, value):
+        with self._lock:
+            self._check_fork()
+            key = (name, labels)
+            self._counters[key] = self._counters.get(key, 0) + value
+        self._maybe_flush()
+
+    def _observe(self, name, labels, value, buckets):
+        with self._lock:
+            self._check_fork()
+            key = (name, labels)
+            state = self._histograms.get(key)
+            if state is None:
+                state = self._histograms[key] = [[0] * len(buckets), 0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+        self._maybe_flush()
+
+    def snapshot(self):
+        """This process's values as a JSON-friendly dict"""
+        with self._lock:
+            self._check_fork()
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                'histograms': [[name, list(labels), list(state[0]), state[1], state[2]]
+                               for (name, labels), state in self._histograms.items()]
+            }
+
+    def _maybe_flush(self):
+        if self.directory and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _flush_loop(self):
+        # Keeps the snapshot current while the worker is idle and records nothing
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(max(self.flush_interval - (time.monotonic() - self._last_flush), 0.1))
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    def flush(self):
+        """Write this process's snapshot for the other workers to read"""
+        if not self.directory:
+            return
+        self._last_flush = time.monotonic()
+        path = os.path.join(self.directory, f'metrics-{os.getpid()}.json')
+        try:
+            with open(path + '.tmp', 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(path + '.tmp', path)
+        except OSError as e:
+            logger.warning(f"Could not write metrics snapshot {path}: {e}")
+
+    def collect(self):
+        """
+        Sum the snapshots of every worker with this process's live values
+
+        Returns:
+            dict: (name, labels) -> counter value, and (name, labels) ->
+                  [bucket counts, sum, count] for histograms
+        """
+        snapshots = [self.snapshot()]
+        if self.directory:
+            own = f'metrics-{os.getpid()}.json'
+            now = time.time()
+            for filename in os.listdir(self.directory):
+                if not filename.endswith('.json') or filename == own:
+                    continue
+                path = os.path.join(self.directory, filename)
+                try:
+                    if now - os.path.getmtime(path) > self.stale_seconds and not _pid_running(filename):
+                        # Worker gone for a while; its totals go with it
+                        os.remove(path)
+                        continue
+                    with open(path) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+
+        counters, histograms = {}, {}
+        for snapshot in snapshots:
+            for name, labels, value in snapshot['counters']:
+                key = (name, tuple(labels))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, bucket_counts, total, count in snapshot['histograms']:
+                key = (name, tuple(labels))
+                state = histograms.get(key)
+                if state is None:
+                    histograms[key] = [list(bucket_counts), total, count]
+                elif len(state[0]) == len(bucket_counts):
+                    state[0] = [a + b for a, b in zip(state[0], bucket_counts)]
+                    state[1] += total
+                    state[2] += count
+        return counters, histograms
+
+    def render_prometheus(self):
+        """All workers' metrics in the Prometheus text exposition format"""
+        counters, histograms = self.collect()
+        lines = []
+        for name in sorted(self._meta):
+            kind, documentation, labelnames, buckets = self._meta[name]
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'counter':
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f'{name}{_labels(labelnames, labels)} {_number(value)}')
+                continue
+            for (metric, labels), (bucket_counts, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{_labels(labelnames, labels, le=_number(bound))} {cumulative}')
+                lines.append(f'{name}_bucket{_labels(labelnames, labels, le="+Inf")} {count}')
+                lines.append(f'{name}_sum{_labels(labelnames, labels)} {_number(total)}')
+                lines.append(f'{name}_count{_labels(labelnames, labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+def _in_uwsgi_master():
+    # A thread there could be holding the registry lock when the workers fork
+    try:
+        import uwsgi
+    except ImportError:
+        return False
+    return uwsgi.worker_id() == 0
+
+def _pid_running(filename):
+    try:
+        os.kill(int(filename[len('metrics-'):-len('.json')]), 0)
+    except ProcessLookupError:
+        return False
+    except (ValueError, OSError):
+        pass
+    return True
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _labels(labelnames, values, **extra):
+    pairs = list(zip(labelnames, values)) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+registry = MetricsRegistry()
+_atexit_registered = False
+
+def init_app(app):
+    """Point the registry at METRICS_DIR so the workers can see each other's values"""
+    registry.configure(
+        directory=app.config.get('METRICS_DIR'),
+        flush_interval=app.config.get('METRICS_FLUSH_SECONDS', 5),
+        stale_seconds=app.config.get('METRICS_STALE_SECONDS', 3600)
+    )
+    global _atexit_registered
+    if not _atexit_registered:
+        atexit.register(registry.flush)
+        _atexit_registered = True
@@ -1,6 +1,14 @@
+import json
+from datetime import datetime
 from . import db
 
 class CartItem(db.Model):
+    __table_args__ = (
+        # Every cart route filters on session_id (and usually sku), so the
+        # composite index also serves plain session_id lookups.
+        db.Index('ix_cart_item_session_id_sku', 'session_id', 'sku', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     sku = db.Column(db.String(50), nullable=False)
     quantity = db.Column(db.Integer, default=1)
@@ -8,4 +16,237 @@ class CartItem(db.Model):
     title = db.Column(db.String(200))
     price = db.Column(db.Float)
     thumbnail = db.Column(db.String(500))
-    spu = db.Column(db.String(50))
\ No newline at end of file
+    spu = db.Column(db.String(50))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Touched on every quantity change; abandoned carts are compacted on this
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+    def to_dict(self):
+        return {
+            'sku': self.sku,
+            'spu': self.spu,
+            'title': self.title,
+            'price': self.price,
+            'quantity': self.quantity,
+            'thumbnail': self.thumbnail
+        }
+
+class OutboxEmail(db.Model):
+    """An email waiting to be sent by the outbox worker (worker.py send-emails)"""
+    __table_args__ = (
+        db.Index('ix_outbox_email_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    recipient = db.Column(db.String(255), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default=STATUS_PENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    @property
+    def payload_dict(self):
+        return json.loads(self.payload) if self.payload else {}
+
+class CheckoutFinalization(db.Model):
+    """A paid Stripe checkout session queued for, or done with, order finalization"""
+    __table_args__ = (
+        db.Index('ix_checkout_finalization_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+    STATUS_QUEUED = 'queued'
+    STATUS_PROCESSING = 'processing'
+    STATUS_FINALIZED = 'finalized'
+    STATUS_FAILED = 'failed'
+
+    id = db.Column(db.Integer, primary_key=True)
+    stripe_session_id = db.Column(db.String(255), nullable=False, unique=True)
+    cart_session_id = db.Column(db.String(100))
+    status = db.Column(db.String(20), nullable=False, default=STATUS_QUEUED)
+    # Stripe checkout session object as delivered by the webhook, if any
+    payload = db.Column(db.Text)
+    order_number = db.Column(db.String(100))
+    customer_email = db.Column(db.String(255))
+    total = db.Column(db.Float)
+    # Items and shipping snapshot rendered by the confirmation page
+    details = db.Column(db.Text)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finalized_at = db.Column(db.DateTime)
+
+    @property
+    def payload_dict(self):
+        return json.loads(self.payload) if self.payload else None
+
+    @property
+    def details_dict(self):
+        return json.loads(self.details) if self.details else {}
+
+class CheckoutSnapshot(db.Model):
+    """The cart lines a Stripe checkout session was created for; finalization records these, not the live cart"""
+    id = db.Column(db.Integer, primary_key=True)
+    stripe_session_id = db.Column(db.String(255), nullable=False, unique=True)
+    cart_session_id = db.Column(db.String(100))
+    # CartItem.to_dict() of every line, as sent to Stripe
+    items = db.Column(db.Text, nullable=False)
+    # What Stripe was asked to charge, in the currency's minor unit
+    amount_total = db.Column(db.Integer, nullable=False)
+    currency = db.Column(db.String(3), nullable=False, default='usd')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    @property
+    def items_list(self):
+        return json.loads(self.items) if self.items else []
+
+class StripeWebhookEvent(db.Model):
+    """A verified Stripe webhook event, stored once per event id and processed by worker.py process-webhooks"""
+    __table_args__ = (
+        db.Index('ix_stripe_webhook_event_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_PROCESSED = 'processed'
+    STATUS_FAILED = 'failed'
+
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.String(255), nullable=False, unique=True)
+    type = db.Column(db.String(100), nullable=False)
+    # Event creation time reported by Stripe (unix seconds), used for ordering
+    stripe_created = db.Column(db.Integer)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default=STATUS_PENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+
+    @property
+    def payload_dict(self):
+        return json.loads(self.payload) if self.payload else {}
+
+class Order(db.Model):
+    """A paid order, written once by checkout finalization"""
+    __tablename__ = 'orders'
+    __table_args__ = (
+        # "orders in state X, oldest first" (e.g. awaiting Winit outbound)
+        db.Index('ix_orders_status_created_at', 'status', 'created_at'),
+        db.Index('ix_orders_status_next_fulfillment_at', 'status', 'next_fulfillment_at'),
+    )
+
+    STATUS_PAID = 'paid'
+    STATUS_SUBMITTED = 'submitted'
+    STATUS_SHIPPED = 'shipped'
+    STATUS_CANCELLED = 'cancelled'
+    STATUS_FULFILLMENT_FAILED = 'fulfillment_failed'
+
+    id = db.Column(db.Integer, primary_key=True)
+    order_number = db.Column(db.String(50), nullable=False, unique=True)
+    stripe_session_id = db.Column(db.String(255), nullable=False, unique=True)
+    status = db.Column(db.String(20), nullable=False, default=STATUS_PAID)
+    customer_email = db.Column(db.String(255), nullable=False, index=True)
+    customer_phone = db.Column(db.String(50))
+    shipping_name = db.Column(db.String(200))
+    shipping_line1 = db.Column(db.String(255))
+    shipping_line2 = db.Column(db.String(255))
+    shipping_city = db.Column(db.String(100))
+    shipping_state = db.Column(db.String(100))
+    shipping_postal_code = db.Column(db.String(20))
+    shipping_country = db.Column(db.String(2))
+    currency = db.Column(db.String(3), nullable=False, default='usd')
+    total = db.Column(db.Float, nullable=False)
+    item_count = db.Column(db.Integer, nullable=False, default=0)
+    # Winit outbound order, set once created; submitted once Winit confirmed it
+    winit_order_num = db.Column(db.String(50), index=True)
+    fulfillment_attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_fulfillment_at = db.Column(db.DateTime, default=datetime.utcnow)
+    fulfillment_error = db.Column(db.Text)
+    submitted_at = db.Column(db.DateTime)
+    # Kept current by worker.py sync-tracking
+    winit_status = db.Column(db.String(50))
+    tracking_number = db.Column(db.String(100))
+    shipped_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    lines = db.relationship('OrderLine', backref='order', lazy='select', order_by='OrderLine.id')
+
+    @property
+    def shipping_details(self):
+        return {
+            'name': self.shipping_name,
+            'address': {
+                'line1': self.shipping_line1,
+                'line2': self.shipping_line2,
+                'city': self.shipping_city,
+                'state': self.shipping_state,
+                'postal_code': self.shipping_postal_code,
+                'country': self.shipping_country
+            }
+        }
+
+class OrderLine(db.Model):
+    """One product line of an Order, copied from the cart at finalization"""
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
+    sku = db.Column(db.String(50), nullable=False)
+    spu = db.Column(db.String(50))
+    title = db.Column(db.String(200))
+    price = db.Column(db.Float, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    thumbnail = db.Column(db.String(500))
+
+    def to_dict(self):
+        return {
+            'sku': self.sku,
+            'spu': self.spu,
+            'title': self.title,
+            'price': self.price,
+            'quantity': self.quantity,
+            'thumbnail': self.thumbnail
+        }
+
+class SyncCursor(db.Model):
+    """Where an incremental sync with an external system left off"""
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.String(100))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class WinitProduct(db.Model):
+    """A Winit catalog product, imported by import_winit_products.py and read when the API is unavailable"""
+    __tablename__ = 'winit_products'
+
+    id = db.Column(db.Integer, primary_key=True)
+    spu = db.Column(db.String(50), unique=True, index=True)
+    sku = db.Column(db.String(50), index=True)
+    name = db.Column(db.String(200), nullable=False)
+    description = db.Column(db.Text)
+    price = db.Column(db.Float)
+    stock = db.Column(db.Integer, default=0)
+    image_url = db.Column(db.String(500))
+    thumbnail_url = db.Column(db.String(500))
+    category = db.Column(db.String(100))
+    brand = db.Column(db.String(100))
+    weight = db.Column(db.Float)
+    dimensions = db.Column(db.String(100))
+    is_active = db.Column(db.Boolean, default=True)
+    # Product as returned by the Winit API, served as-is by the fallback
+    additional_data = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @property
+    def additional_data_dict(self):
+        return json.loads(self.additional_data) if self.additional_data else {}
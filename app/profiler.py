@@ -0,0 +1,194 @@
+"""
+Sampling profiler for production requests
+
+When PROFILER_ENABLED is set, a PROFILER_SAMPLE_RATE fraction of the requests
+to PROFILER_ENDPOINTS (main.index, and with it ProductService.get_products,
+plus the checkout routes by default) is profiled, and so is any request that
+carries a token from make_profile_token.py in the X-Profile header or the
+_profile query argument. A daemon thread reads the stack of each profiled
+request's thread every PROFILER_INTERVAL_MS and the samples are written to
+LOG_DIR/profiles in the collapsed format flamegraph.pl and speedscope read:
+
+    app/blueprints/main.py:index;app/services/product_service.py:ProductService.get_products;... 42
+
+Sampled requests are appended to one file per endpoint and day; a token
+request gets a file of its own, named in the X-Profile-File response header.
+Requests that are not profiled only pay for one random() call. Under uWSGI
+the sampler thread needs enable-threads (or threads); without it the
+profiler stays off.
+"""
+import os
+import sys
+import time
+import random
+import fnmatch
+import sysconfig
+import threading
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+from flask import g, request
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+TOKEN_SALT = 'request-profiler'
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_STDLIB = sysconfig.get_paths()['stdlib']
+
+def make_token(secret_key, note=''):
+    """Sign a token that turns profiling on for the requests carrying it"""
+    return URLSafeTimedSerializer(secret_key, salt=TOKEN_SALT).dumps({'note': note})
+
+def check_token(secret_key, token, max_age):
+    """The token's payload, or None if it is forged or older than max_age seconds"""
+    try:
+        return URLSafeTimedSerializer(secret_key, salt=TOKEN_SALT).loads(token, max_age=max_age)
+    except BadSignature:
+        return None
+
+@lru_cache(maxsize=4096)
+def _frame_name(code):
+    # No line numbers, so samples from anywhere in a function add up
+    filename = code.co_filename
+    if filename.startswith(_ROOT + os.sep):
+        filename = filename[len(_ROOT) + 1:]
+    elif filename.startswith(_STDLIB + os.sep):
+        filename = filename[len(_STDLIB) + 1:]
+    elif 'site-packages' + os.sep in filename:
+        filename = filename.split('site-packages' + os.sep, 1)[1]
+    # co_qualname (Class.method) is Python 3.11+; older interpreters get the bare name
+    return f"{filename}:{getattr(code, 'co_qualname', code.co_name)}"
+
+class StackProfile:
+    """Collapsed stack samples of one thread"""
+
+    def __init__(self, label):
+        self.label = label
+        self.samples = Counter()
+        self.started = time.perf_counter()
+
+    def add(self, frame):
+        stack = []
+        while frame is not None:
+            stack.append(_frame_name(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        self.samples[';'.join(stack)] += 1
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.samples.items())
+
+    def write(self, path):
+        """Append the samples to path; appending keeps repeated stacks summable"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a') as f:
+            f.write(self.collapsed())
+
+class StackSampler:
+    """One daemon thread per process sampling the threads being profiled"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._targets = {}
+        self._pid = None
+
+    def start(self, profile, ident=None):
+        with self._lock:
+            if self._pid != os.getpid():
+                # First use, or a forked worker: the parent's thread did not survive
+                self._pid = os.getpid()
+                self._targets = {}
+                threading.Thread(target=self._run, name='stack-sampler', daemon=True).start()
+            self._targets[ident or threading.get_ident()] = profile
+            self._wake.set()
+
+    def stop(self, ident=None):
+        with self._lock:
+            return self._targets.pop(ident or threading.get_ident(), None)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                targets = list(self._targets.items())
+                if not targets:
+                    self._wake.clear()
+            if not targets:
+                self._wake.wait()
+                continue
+
+            frames = sys._current_frames()
+            for ident, profile in targets:
+                frame = frames.get(ident)
+                if frame is not None:
+                    profile.add(frame)
+            del frames
+            time.sleep(self.interval)
+
+sampler = StackSampler()
+
+def _threads_disabled():
+    """Whether this is a uWSGI process whose Python threads never get to run"""
+    try:
+        import uwsgi
+        return not (uwsgi.opt.get('enable-threads') or uwsgi.opt.get('threads'))
+    except (ImportError, AttributeError):
+        return False
+
+def init_app(app):
+    """Install the profiling hooks if PROFILER_ENABLED is set"""
+    if not app.config.get('PROFILER_ENABLED'):
+        return
+    if _threads_disabled():
+        app.logger.warning("PROFILER_ENABLED is set but uWSGI runs without enable-threads; "
+                           "the stack sampler could not run, so profiling stays off")
+        return
+    sampler.interval = app.config.get('PROFILER_INTERVAL_MS', 5) / 1000
+    sample_rate = app.config.get('PROFILER_SAMPLE_RATE', 0.0)
+    endpoints = [p.strip() for p in app.config.get('PROFILER_ENDPOINTS', '').split(',') if p.strip()]
+    max_age = app.config.get('PROFILER_TOKEN_MAX_AGE', 3600)
+    directory = os.path.join(app.config['LOG_DIR'], 'profiles')
+
+    @app.before_request
+    def start_stack_profile():
+        endpoint = request.endpoint or 'unknown'
+        token = request.headers.get('X-Profile') or request.args.get('_profile')
+        if token:
+            payload = check_token(app.config['SECRET_KEY'], token, max_age)
+            if payload is None:
+                app.logger.warning(f"Ignoring invalid or expired profile token for {request.path}")
+                return
+            filename = f"{endpoint}-{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}.collapsed"
+            g.stack_profile_note = payload.get('note') or ''
+        elif sample_rate and random.random() < sample_rate \
+                and any(fnmatch.fnmatchcase(endpoint, p) for p in endpoints):
+            filename = f"sampled-{endpoint}-{datetime.now():%Y%m%d}.collapsed"
+        else:
+            return
+        g.stack_profile_path = os.path.join(directory, filename)
+        sampler.start(StackProfile(f"{request.method} {request.path}"))
+
+    @app.after_request
+    def name_stack_profile(response):
+        if 'stack_profile_note' in g:
+            response.headers['X-Profile-File'] = os.path.basename(g.stack_profile_path)
+        return response
+
+    @app.teardown_request
+    def finish_stack_profile(exc):
+        path = g.pop('stack_profile_path', None)
+        if path is None:
+            return
+        profile = sampler.stop()
+        if profile is None:
+            return
+        try:
+            profile.write(path)
+        except OSError as e:
+            app.logger.warning(f"Could not write stack profile {path}: {e}")
+            return
+        note = g.pop('stack_profile_note', None)
+        app.logger.info(
+            f"Stack profile [{profile.label}]: {sum(profile.samples.values())} samples in "
+            f"{(time.perf_counter() - profile.started) * 1000:.1f} ms -> {path}"
+            + (f" ({note})" if note else ''))
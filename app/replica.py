@@ -0,0 +1,132 @@
+"""
+Read-replica routing for catalog and reporting reads
+
+When REPLICA_DATABASE_URL is set it becomes the 'replica' bind, and
+read_session() hands out a session bound to it for the reads that can
+tolerate a little staleness: the Winit catalog fallback and search, and order
+reporting. Everything else, and every write (carts, checkout, orders), keeps
+using db.session on the primary.
+
+How far behind the replica is comes from a heartbeat row (SyncCursor
+'replica_heartbeat') that worker.py replica-heartbeat stamps on the primary:
+its replicated copy shows when the replica last caught up. The lag is checked
+at most every REPLICA_LAG_CHECK_SECONDS per process; a replica that is more
+than REPLICA_MAX_LAG_SECONDS behind, has no heartbeat or cannot be reached
+sends reads to the primary until it catches up again. For local testing a
+copy of the SQLite database can stand in for the replica.
+"""
+import time
+import logging
+import threading
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db
+from app.metrics import registry
+from app.models import SyncCursor
+
+logger = logging.getLogger('replica')
+
+HEARTBEAT = 'replica_heartbeat'
+
+READS = registry.counter(
+    'db_read_routing_total', 'Replica-eligible reads by the database that served them', ['target'])
+REPLICA_LAG = registry.histogram(
+    'db_replica_lag_seconds', 'Replica lag by the heartbeat row, observed at each check',
+    buckets=(1, 2, 5, 10, 30, 60, 300, 900))
+
+class ReplicaRouter:
+    """Replica session for one app, plus the cached lag check that decides whether to use it"""
+
+    def __init__(self, app):
+        self.app = app
+        self.engine = db.get_engine(app, bind='replica')
+        # binds={}: Flask-SQLAlchemy would otherwise map every table to the primary
+        self.session = db.create_scoped_session(options={'bind': self.engine, 'binds': {}, 'autoflush': False})
+        self._lock = threading.Lock()
+        self._checked_at = None
+        self._healthy = False
+
+    def replica_lag(self):
+        """
+        Seconds since the replica's copy of the heartbeat was written
+
+        Returns:
+            float: Lag in seconds, or None if the replica has no heartbeat yet
+        """
+        with self.engine.connect() as connection:
+            value = connection.execute(
+                select(SyncCursor.__table__.c.value).where(SyncCursor.__table__.c.name == HEARTBEAT)).scalar()
+        if not value:
+            return None
+        return max((datetime.utcnow() - datetime.fromisoformat(value)).total_seconds(), 0.0)
+
+    def use_replica(self):
+        """Whether replica-eligible reads go to the replica right now"""
+        now = time.monotonic()
+        interval = self.app.config['REPLICA_LAG_CHECK_SECONDS']
+        if self._checked_at is not None and now - self._checked_at < interval:
+            return self._healthy
+
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < interval:
+                return self._healthy
+            try:
+                lag = self.replica_lag()
+            except (SQLAlchemyError, ValueError) as e:
+                lag, reason = None, f"unreachable ({e})"
+            else:
+                reason = 'no heartbeat' if lag is None else f"{lag:.0f}s behind"
+
+            if lag is not None:
+                REPLICA_LAG.observe(lag)
+            healthy = lag is not None and lag <= self.app.config['REPLICA_MAX_LAG_SECONDS']
+            if healthy != self._healthy:
+                if healthy:
+                    logger.info(f"Replica caught up ({reason}), reading from it again")
+                else:
+                    logger.warning(f"Replica {reason}, reading from the primary")
+            self._healthy = healthy
+            self._checked_at = now
+            return healthy
+
+def read_session():
+    """
+    Session for reads that may be served by the replica
+
+    Objects loaded through it belong to the replica session: never modify
+    them, read and write through db.session instead.
+
+    Returns:
+        The replica session when one is configured and caught up, otherwise db.session
+    """
+    router = current_app.extensions.get('replica_router')
+    if router is not None and router.use_replica():
+        READS.inc(target='replica')
+        return router.session
+    READS.inc(target='primary')
+    return db.session
+
+def write_heartbeat():
+    """Stamp the heartbeat row on the primary for the replica to copy"""
+    cursor = db.session.get(SyncCursor, HEARTBEAT)
+    if cursor is None:
+        cursor = SyncCursor(name=HEARTBEAT)
+        db.session.add(cursor)
+    cursor.value = datetime.utcnow().isoformat()
+    db.session.commit()
+    return cursor.value
+
+def init_app(app):
+    """Set up the replica session if REPLICA_DATABASE_URL is configured"""
+    if not (app.config.get('SQLALCHEMY_BINDS') or {}).get('replica'):
+        return
+
+    router = ReplicaRouter(app)
+    app.extensions['replica_router'] = router
+
+    @app.teardown_appcontext
+    def remove_replica_session(exception=None):
+        router.session.remove()
@@ -0,0 +1,486 @@
+"""
+Service for shopping cart storage
+
+Carts live behind a small backend interface so the hot add/update path can
+be moved off the main database:
+
+- SQLCartBackend (default) keeps carts in the cart_item table.
+- LocalCartBackend keeps carts in a local SQLite file in WAL mode that all
+  uWSGI workers on the host share, with TTL expiry. Carts are copied into
+  cart_item only when the shopper checks out.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from app.models import CartItem, db
+
+logger = logging.getLogger('cart_service')
+
+def unit_amount(price):
+    """A cart price as the Stripe unit_amount (minor currency unit) the shopper is charged"""
+    return int(price * 100)
+
+class SQLCartBackend:
+    """Cart storage in the cart_item table"""
+
+    def get_items(self, session_id):
+        """Get all items in a cart"""
+        return CartItem.query.filter_by(session_id=session_id).all()
+
+    def get_summary(self, session_id):
+        """Get the item count and total of a cart in a single aggregate query"""
+        item_count, total = db.session.query(
+            func.coalesce(func.sum(CartItem.quantity), 0),
+            func.coalesce(func.sum(CartItem.price * CartItem.quantity), 0)
+        ).filter(CartItem.session_id == session_id).one()
+
+        return {'item_count': int(item_count), 'total': float(total)}
+
+    def add_item(self, session_id, sku, attributes):
+        """
+        Add one unit of a SKU to a cart with a single atomic upsert
+
+        The insert and the quantity bump happen in one statement, so concurrent
+        clicks can neither race nor create duplicate (session_id, sku) rows.
+        """
+        cart_item = CartItem.__table__
+        values = dict(attributes, session_id=session_id, sku=sku, quantity=1)
+        # Upserts skip Python-side onupdate hooks, so touch the row explicitly
+        bump = {'quantity': cart_item.c.quantity + 1, 'updated_at': datetime.utcnow()}
+
+        dialect = db.session().get_bind(CartItem.__mapper__).dialect.name
+        if dialect == 'mysql':
+            stmt = mysql.insert(cart_item).values(**values).on_duplicate_key_update(**bump)
+        elif dialect == 'sqlite':
+            stmt = sqlite.insert(cart_item).values(**values).on_conflict_do_update(
+                index_elements=['session_id', 'sku'], set_=bump)
+        else:
+            stmt = None
+
+        if stmt is not None:
+            db.session.execute(stmt)
+        else:
+            # Generic fallback: try the bump first, insert when nothing matched
+            # and let the unique index arbitrate a concurrent insert.
+            if not self._change_quantity(session_id, sku, 1):
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(cart_item.insert().values(**values))
+                except IntegrityError:
+                    self._change_quantity(session_id, sku, 1)
+        db.session.commit()
+
+    def apply_changes(self, session_id, changes):
+        """
+        Apply folded quantity deltas in one transaction
+
+        Increments and decrements that leave a positive quantity cost one
+        conditional UPDATE; only a decrement that empties the line falls
+        through to a DELETE. Either way the batch is a single commit.
+        """
+        try:
+            for sku, change in changes.items():
+                self._change_quantity(session_id, sku, change)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def clear(self, session_id):
+        """Remove every line of a cart"""
+        CartItem.query.filter_by(session_id=session_id).delete(synchronize_session=False)
+        db.session.commit()
+
+    def persist(self, session_id):
+        """Carts already live in cart_item, nothing to copy"""
+
+    def compact(self, ttl, batch_size, pause=0):
+        """
+        Delete cart rows not touched for ttl seconds, batch_size rows at a time
+
+        Each batch selects ids through the updated_at index and deletes them
+        by primary key in its own short transaction, so the job never holds
+        locks on a large range of cart_item.
+
+        Returns:
+            int: Number of rows deleted
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=ttl)
+        reclaimed = 0
+        while True:
+            ids = [row.id for row in db.session.query(CartItem.id)
+                   .filter(CartItem.updated_at < cutoff)
+                   .order_by(CartItem.updated_at)
+                   .limit(batch_size)]
+            if not ids:
+                break
+
+            CartItem.query.filter(CartItem.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+            reclaimed += len(ids)
+
+            if len(ids) < batch_size:
+                break
+            if pause:
+                time.sleep(pause)
+        return reclaimed
+
+    def _change_quantity(self, session_id, sku, change):
+        """Apply a quantity delta without committing. Returns True if a row matched."""
+        cart_item = CartItem.__table__
+        match = (cart_item.c.session_id == session_id) & (cart_item.c.sku == sku)
+
+        result = db.session.execute(
+            cart_item.update()
+            .where(match & (cart_item.c.quantity + change > 0))
+            .values(quantity=cart_item.c.quantity + change)
+        )
+        if result.rowcount:
+            return True
+        if change >= 0:
+            return False
+
+        result = db.session.execute(cart_item.delete().where(match))
+        return bool(result.rowcount)
+
+class LocalCartBackend:
+    """
+    Cart storage in a host-local SQLite file shared by all workers
+
+    WAL mode lets readers in one worker proceed while another worker writes.
+    A cart expires as a whole once it has not been touched for ttl seconds.
+    Connections are opened per thread and per process, so nothing is shared
+    across a uWSGI fork.
+    """
+
+    COLUMNS = ('sku', 'quantity', 'title', 'price', 'thumbnail', 'spu')
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS cart_item (
+                session_id TEXT NOT NULL,
+                sku TEXT NOT NULL,
+                quantity INTEGER NOT NULL,
+                title TEXT,
+                price REAL,
+                thumbnail TEXT,
+                spu TEXT,
+                touched_at REAL NOT NULL,
+                PRIMARY KEY (session_id, sku)
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_cart_item_touched_at ON cart_item (touched_at)')
+
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _write(self, session_id, statements):
+        """Run write statements for one cart in a single transaction and touch the cart"""
+        now = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Drop an expired cart first so stale lines are not revived by the touch below
+            conn.execute('DELETE FROM cart_item WHERE session_id = ? AND touched_at < ?',
+                         (session_id, now - self.ttl))
+            statements(conn, now)
+            conn.execute('UPDATE cart_item SET touched_at = ? WHERE session_id = ?', (now, session_id))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def get_items(self, session_id):
+        """Get all items in a cart as unattached CartItem objects"""
+        rows = self._connection().execute(
+            'SELECT sku, quantity, title, price, thumbnail, spu FROM cart_item '
+            'WHERE session_id = ? AND touched_at >= ? ORDER BY rowid',
+            (session_id, time.time() - self.ttl)
+        ).fetchall()
+        return [CartItem(session_id=session_id, **dict(zip(self.COLUMNS, row))) for row in rows]
+
+    def get_summary(self, session_id):
+        """Get the item count and total of a cart in a single aggregate query"""
+        item_count, total = self._connection().execute(
+            'SELECT COALESCE(SUM(quantity), 0), COALESCE(SUM(price * quantity), 0) '
+            'FROM cart_item WHERE session_id = ? AND touched_at >= ?',
+            (session_id, time.time() - self.ttl)
+        ).fetchone()
+        return {'item_count': int(item_count), 'total': float(total)}
+
+    def add_item(self, session_id, sku, attributes):
+        """Add one unit of a SKU to a cart with an upsert"""
+        def statements(conn, now):
+            conn.execute(
+                'INSERT INTO cart_item (session_id, sku, quantity, title, price, thumbnail, spu, touched_at) '
+                'VALUES (?, ?, 1, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (session_id, sku) DO UPDATE SET quantity = quantity + 1',
+                (session_id, sku, attributes.get('title'), attributes.get('price'),
+                 attributes.get('thumbnail'), attributes.get('spu'), now)
+            )
+        self._write(session_id, statements)
+
+    def apply_changes(self, session_id, changes):
+        """Apply folded quantity deltas in one transaction"""
+        def statements(conn, now):
+            for sku, change in changes.items():
+                cursor = conn.execute(
+                    'UPDATE cart_item SET quantity = quantity + ? '
+                    'WHERE session_id = ? AND sku = ? AND quantity + ? > 0',
+                    (change, session_id, sku, change)
+                )
+                if not cursor.rowcount and change < 0:
+                    conn.execute('DELETE FROM cart_item WHERE session_id = ? AND sku = ?',
+                                 (session_id, sku))
+        self._write(session_id, statements)
+
+    def clear(self, session_id):
+        """Remove a cart from the local store and from cart_item"""
+        self._connection().execute('DELETE FROM cart_item WHERE session_id = ?', (session_id,))
+        SQLCartBackend().clear(session_id)
+
+    def persist(self, session_id):
+        """Copy a cart into cart_item so checkout can be completed from the database"""
+        items = self.get_items(session_id)
+        try:
+            CartItem.query.filter_by(session_id=session_id).delete(synchronize_session=False)
+            db.session.bulk_insert_mappings(
+                CartItem, [dict(item.to_dict(), session_id=session_id) for item in items])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def purge_expired(self, ttl=None, batch_size=500, pause=0):
+        """
+        Delete expired carts, batch_size rows at a time
+
+        Runs from the compact-carts job, never on a shopper's request. Each
+        batch is its own short write transaction, so workers writing carts
+        wait at most one batch for the file lock.
+
+        Returns:
+            int: Number of rows removed
+        """
+        cutoff = time.time() - (ttl or self.ttl)
+        conn = self._connection()
+        reclaimed = 0
+        while True:
+            cursor = conn.execute(
+                'DELETE FROM cart_item WHERE rowid IN '
+                '(SELECT rowid FROM cart_item WHERE touched_at < ? ORDER BY touched_at LIMIT ?)',
+                (cutoff, batch_size))
+            reclaimed += cursor.rowcount
+            if cursor.rowcount < batch_size:
+                return reclaimed
+            if pause:
+                time.sleep(pause)
+
+    def compact(self, ttl, batch_size, pause=0):
+        """
+        Purge expired carts from the local store and cart_item
+
+        Carts copied to cart_item at checkout but never paid for are
+        compacted there the same way as with the SQL backend.
+        """
+        return self.purge_expired(ttl, batch_size, pause) + SQLCartBackend().compact(ttl, batch_size, pause)
+
+class CartService:
+    """Service for cart storage keyed by the shopper's session id"""
+
+    def __init__(self, app=None):
+        app = app or current_app._get_current_object()
+        self.backend = app.extensions.get('cart_backend')
+        if self.backend is None:
+            self.backend = app.extensions['cart_backend'] = self._create_backend(app)
+
+    @staticmethod
+    def _create_backend(app):
+        backend = app.config.get('CART_BACKEND', 'sql')
+        if backend == 'local':
+            return LocalCartBackend(app.config['CART_STORE_PATH'], app.config['CART_TTL_SECONDS'])
+        if backend != 'sql':
+            raise ValueError(f"Unknown CART_BACKEND: {backend}")
+        return SQLCartBackend()
+
+    def get_items(self, session_id):
+        """Get all items in a cart"""
+        if not session_id:
+            return []
+        return self.backend.get_items(session_id)
+
+    def get_persisted_items(self, session_id):
+        """Get the copy of a cart that was persisted to cart_item at checkout"""
+        if not session_id:
+            return []
+        return CartItem.query.filter_by(session_id=session_id).all()
+
+    def get_summary(self, session_id):
+        """
+        Get the item count and total of a cart in a single aggregate query
+
+        Args:
+            session_id: Cart session id
+
+        Returns:
+            dict: {'item_count': int, 'total': float}
+        """
+        if not session_id:
+            return {'item_count': 0, 'total': 0.0}
+        return self.backend.get_summary(session_id)
+
+    def add_item(self, session_id, sku, title=None, price=None, thumbnail=None, spu=None):
+        """
+        Add one unit of a SKU to a cart
+
+        Args:
+            session_id: Cart session id
+            sku: Product SKU
+            title, price, thumbnail, spu: Product attributes stored on first add
+        """
+        self.backend.add_item(session_id, sku, {
+            'title': title,
+            'price': price,
+            'thumbnail': thumbnail,
+            'spu': spu
+        })
+
+    def update_quantity(self, session_id, sku, change):
+        """
+        Change the quantity of a cart line, removing it when it drops to zero
+
+        Args:
+            session_id: Cart session id
+            sku: Product SKU
+            change: Signed quantity delta
+        """
+        self.apply_changes(session_id, [(sku, change)])
+
+    def apply_changes(self, session_id, changes):
+        """
+        Apply several quantity deltas to a cart in one transaction
+
+        Deltas for the same SKU are folded together first, so a burst of
+        debounced +/- clicks costs at most one statement per SKU and a
+        single commit.
+
+        Args:
+            session_id: Cart session id
+            changes: Iterable of (sku, delta) pairs
+        """
+        folded = {}
+        for sku, change in changes:
+            folded[sku] = folded.get(sku, 0) + change
+        folded = {sku: change for sku, change in folded.items() if change}
+
+        if folded:
+            self.backend.apply_changes(session_id, folded)
+
+    def get_checkout_payload(self, session_id, currency='usd'):
+        """
+        Get the Stripe-ready form of a cart from its stored lines
+
+        Built from the backend on every call, so whichever worker serves the
+        request the payload matches the stored cart.
+
+        Args:
+            session_id: Cart session id
+            currency: ISO currency code for the line items
+
+        Returns:
+            dict: 'line_items' (Stripe price_data line items),
+                  'items' (the cart lines as dicts), 'amount_total' (what
+                  Stripe will charge, in cents), 'total', 'item_count',
+                  'currency' and 'fingerprint', a hash of the cart id and
+                  contents
+
+        Raises:
+            ValueError: A cart line has no valid price
+        """
+        line_items = []
+        items = []
+        total = 0.0
+        item_count = 0
+        for item in self.get_items(session_id):
+            if not item.price or item.price <= 0:
+                raise ValueError(f'Invalid price for item {item.title}')
+            line_items.append({
+                'price_data': {
+                    'currency': currency,
+                    'product_data': {
+                        'name': item.title,
+                        'images': [item.thumbnail] if item.thumbnail else [],
+                    },
+                    'unit_amount': unit_amount(item.price),
+                },
+                'quantity': item.quantity,
+            })
+            items.append(item.to_dict())
+            total += item.price * item.quantity
+            item_count += item.quantity
+
+        fingerprint = hashlib.sha256(
+            json.dumps([session_id, line_items], sort_keys=True).encode('utf-8')).hexdigest()
+        payload = {
+            'line_items': line_items,
+            'items': items,
+            'amount_total': sum(line['price_data']['unit_amount'] * line['quantity'] for line in line_items),
+            'total': total,
+            'item_count': item_count,
+            'currency': currency,
+            'fingerprint': fingerprint
+        }
+        return payload
+
+    def persist(self, session_id):
+        """Make sure a cart is stored in cart_item before handing it to checkout"""
+        self.backend.persist(session_id)
+
+    def clear(self, session_id):
+        """Remove a cart after it has been checked out"""
+        if session_id:
+            self.backend.clear(session_id)
+
+    def compact_expired(self, ttl=None, batch_size=None, pause=0):
+        """
+        Delete abandoned carts in bounded batches
+
+        Args:
+            ttl: Seconds without a change after which a cart is abandoned
+                 (default: CART_TTL_SECONDS)
+            batch_size: Rows deleted per transaction (default: CART_COMPACTION_BATCH_SIZE)
+            pause: Seconds to sleep between batches
+
+        Returns:
+            int: Number of rows reclaimed
+        """
+        ttl = ttl or current_app.config['CART_TTL_SECONDS']
+        batch_size = batch_size or current_app.config['CART_COMPACTION_BATCH_SIZE']
+        return self.backend.compact(ttl, batch_size, pause)
@@ -0,0 +1,64 @@
+"""
+Worker that drains the email outbox with retries and exponential backoff
+"""
+import logging
+from datetime import datetime
+from flask import current_app
+
+from app.models import OutboxEmail, db
+from app.services.email_service import EmailService
+from app.services.retry import WorkQueue
+
+logger = logging.getLogger('email_outbox')
+
+class EmailOutboxWorker:
+    """Sends queued outbox emails, rescheduling failures with backoff"""
+
+    def __init__(self, app=None, email_service=None):
+        self.app = app or current_app._get_current_object()
+        self.email_service = email_service or EmailService.from_app(self.app)
+        self.batch_size = self.app.config['MAIL_OUTBOX_BATCH_SIZE']
+        self.max_attempts = self.app.config['MAIL_OUTBOX_MAX_ATTEMPTS']
+        self.queue = WorkQueue(OutboxEmail, OutboxEmail.STATUS_PENDING, OutboxEmail.STATUS_FAILED,
+                               claimed_status=OutboxEmail.STATUS_SENDING,
+                               retry_base=self.app.config['MAIL_OUTBOX_RETRY_BASE_SECONDS'],
+                               retry_max=self.app.config['MAIL_OUTBOX_RETRY_MAX_SECONDS'])
+
+    def drain(self, batch_size=None):
+        """
+        Send one batch of due emails
+
+        Args:
+            batch_size: Maximum number of emails to send (default: MAIL_OUTBOX_BATCH_SIZE)
+
+        Returns:
+            dict: Counts of 'sent', 'retried' and 'failed' emails
+        """
+        stats = {'sent': 0, 'retried': 0, 'failed': 0}
+
+        # The batch shares the service's SMTP session, but every email is
+        # committed as sent right after its own send, so a crash mid-batch
+        # never leaves a delivered email pending to go out again
+        for outbox_email in self._claim(batch_size or self.batch_size):
+            try:
+                self.email_service.deliver(outbox_email)
+            except Exception as e:
+                stats[self._reschedule(outbox_email, e)] += 1
+            else:
+                outbox_email.status = OutboxEmail.STATUS_SENT
+                outbox_email.sent_at = datetime.utcnow()
+                outbox_email.last_error = None
+                stats['sent'] += 1
+            db.session.commit()
+        return stats
+
+    def _claim(self, batch_size):
+        """Claim due emails so concurrent workers never send the same one twice"""
+        claimed = self.queue.claim(batch_size)
+        if not claimed:
+            return []
+        return OutboxEmail.query.filter(OutboxEmail.id.in_(claimed)).order_by(OutboxEmail.id).all()
+
+    def _reschedule(self, outbox_email, error):
+        return self.queue.reschedule(outbox_email, error, self.max_attempts,
+                                     f"outbox email {outbox_email.id} to {outbox_email.recipient}")
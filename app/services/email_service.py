@@ -1,20 +1,167 @@
-from flask import current_app, render_template
-from flask_mail import Message, Mail
+import json
+import os
+import smtplib
+import threading
+import time
+from flask import current_app
+from flask_mail import Message, Mail, Connection
 from datetime import datetime
+from app.instrumentation import timed
+
+class SMTPConnection(Connection):
+    """
+    Flask-Mail connection kept open and shared by one worker process
+
+    The SMTP handshake, STARTTLS and AUTH happen once and the session is
+    reused for every message; Flask-Mail still validates and sends each one
+    and re-opens the session every MAIL_MAX_EMAILS. A connection idle for
+    longer than idle_check seconds is probed with NOOP before use, and a
+    dropped connection is re-opened and the message retried once.
+    """
+
+    def __init__(self, mail_state, idle_check=30, timeout=30):
+        super().__init__(mail_state)
+        self.idle_check = idle_check
+        self.timeout = timeout
+        self.host = None
+        self.num_emails = 0
+        self._pid = None
+        self._last_used = 0
+        self._lock = threading.Lock()
+
+    def configure_host(self):
+        host = super().configure_host()
+        host.sock.settimeout(self.timeout)
+        self._pid = os.getpid()
+        return host
+
+    def _check_host(self):
+        # A connection inherited across fork belongs to the parent process
+        if self.host is not None and self._pid != os.getpid():
+            self.host = None
+
+        if self.host is not None and time.time() - self._last_used > self.idle_check:
+            try:
+                if self.host.noop()[0] != 250:
+                    self.close()
+            except (smtplib.SMTPException, OSError):
+                self.host = None
+
+        if self.host is None:
+            self.host = self.configure_host()
+            self.num_emails = 0
+
+    def send(self, message, envelope_from=None):
+        """Send one message, reconnecting once if the server dropped the session"""
+        # Flask-Mail checks these with assert, which python -O strips
+        if not message.send_to:
+            raise ValueError("No recipients have been added")
+        if not message.sender:
+            raise ValueError("The message does not specify a sender and a default sender has not been configured")
+
+        with self._lock, timed('email'):
+            if not self.mail.suppress:
+                self._check_host()
+            try:
+                super().send(message, envelope_from)
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                # The server closed the session under us; reconnect and retry once
+                self.host = self.configure_host()
+                super().send(message, envelope_from)
+            self._last_used = time.time()
+
+    def close(self):
+        if self.host is not None:
+            try:
+                self.host.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.host = None
 
 class EmailService:
+    ORDER_CONFIRMATION = 'order_confirmation'
+
+    ORDER_CONFIRMATION_TEMPLATES = ('email/order_confirmation.html', 'email/order_confirmation.txt')
+
     def __init__(self, app=None):
         self._mail = None
+        self._connection = None
+        self._templates = {}
         if app:
             self.init_app(app)
 
     def init_app(self, app):
         self._mail = Mail(app)
+        self._connection = SMTPConnection(
+            self._mail.state,
+            idle_check=app.config.get('MAIL_CONNECTION_IDLE_CHECK_SECONDS', 30),
+            timeout=app.config.get('MAIL_TIMEOUT', 30)
+        )
+        app.extensions['email_service'] = self
+
+    @classmethod
+    def from_app(cls, app):
+        """Get the app's shared EmailService, creating it on first use"""
+        return app.extensions.get('email_service') or cls(app)
+
+    def queue_order_confirmation(self, order_data, commit=True):
+        """
+        Queue an order confirmation email in the outbox
+
+        The email is stored in the database and sent later by the outbox
+        worker (worker.py send-emails), so the request never waits on SMTP.
+
+        Args:
+            order_data (dict): Same keys as send_order_confirmation
+            commit: Commit immediately; pass False to enqueue as part of a
+                    larger transaction owned by the caller
+
+        Returns:
+            OutboxEmail: The queued outbox row
+        """
+        from app.models import OutboxEmail, db
+
+        payload = {
+            'email': order_data['email'],
+            'items': [item.to_dict() if hasattr(item, 'to_dict') else dict(item)
+                      for item in order_data['items']],
+            'total': order_data['total'],
+            'shipping_details': order_data['shipping_details'],
+            'order_number': order_data['order_number'],
+            'order_date': order_data.get('order_date') or datetime.now().strftime('%B %d, %Y')
+        }
+
+        outbox_email = OutboxEmail(
+            kind=self.ORDER_CONFIRMATION,
+            recipient=order_data['email'],
+            payload=json.dumps(payload)
+        )
+        db.session.add(outbox_email)
+        if commit:
+            db.session.commit()
+        current_app.logger.info(f"Order confirmation email for {order_data['email']} queued")
+        return outbox_email
+
+    def deliver(self, outbox_email):
+        """
+        Send a queued outbox email, raising on failure so the worker can retry
+
+        Args:
+            outbox_email (OutboxEmail): Row claimed by the outbox worker
+        """
+        self._send(self.build_message(outbox_email))
+
+    def build_message(self, outbox_email):
+        """Render the message for a queued outbox email"""
+        if outbox_email.kind != self.ORDER_CONFIRMATION:
+            raise ValueError(f"Unknown outbox email kind: {outbox_email.kind}")
+
+        return self._build_order_confirmation(outbox_email.payload_dict)
 
     def send_order_confirmation(self, order_data):
         """
         Send order confirmation email
-        
+
         Args:
             order_data (dict): Dictionary containing:
                 - email: Customer's email address
@@ -24,32 +171,86 @@ class EmailService:
                 - order_number: Order number
         """
         try:
-            msg = Message(
-                'Order Confirmation - Thank you for your purchase!',
-                sender=current_app.config['MAIL_DEFAULT_SENDER'],
-                recipients=[order_data['email']]
-            )
-
-            # Prepare template data
-            template_data = {
-                'items': order_data['items'],
-                'total': order_data['total'],
-                'shipping_details': order_data['shipping_details'],
-                'order_number': order_data['order_number'],
-                'order_date': datetime.now().strftime('%B %d, %Y')
-            }
-
-            # Render both HTML and plain-text versions
-            msg.html = render_template('email/order_confirmation.html', **template_data)
-            msg.body = render_template('email/order_confirmation.txt', **template_data)
-
-            if self._mail is None:
-                raise RuntimeError("EmailService not properly initialized")
-                
-            self._mail.send(msg)
+            self._send(self._build_order_confirmation(order_data))
             current_app.logger.info(f"Order confirmation email sent to {order_data['email']}")
             return True
 
         except Exception as e:
             current_app.logger.error(f"Failed to send order confirmation email: {str(e)}")
-            return False 
\ No newline at end of file
+            return False
+
+    def render_order_confirmation(self, order_data):
+        """
+        Render the HTML and plain-text order confirmation
+
+        Both variants come from compiled templates held by the service and
+        share one template context, so the Jinja context and the formatted
+        amounts are built once.
+
+        Returns:
+            tuple: (html, text)
+        """
+        # Money is formatted once here instead of in each template
+        items = []
+        for item in order_data['items']:
+            item = item.to_dict() if hasattr(item, 'to_dict') else dict(item)
+            item['price_display'] = '%.2f' % item['price']
+            item['line_total_display'] = '%.2f' % (item['price'] * item['quantity'])
+            items.append(item)
+
+        context = {
+            'items': items,
+            'total': order_data['total'],
+            'total_display': '%.2f' % order_data['total'],
+            'shipping_details': order_data['shipping_details'],
+            'order_number': order_data['order_number'],
+            'order_date': order_data.get('order_date') or datetime.now().strftime('%B %d, %Y')
+        }
+        current_app.update_template_context(context)
+
+        html_template, text_template = self._get_templates(self.ORDER_CONFIRMATION_TEMPLATES)
+        return html_template.render(context), text_template.render(context)
+
+    def _get_templates(self, names):
+        """Compiled templates, loaded once per service (re-checked when templates auto-reload)"""
+        if current_app.jinja_env.auto_reload:
+            return [current_app.jinja_env.get_template(name) for name in names]
+
+        templates = self._templates.get(names)
+        if templates is None:
+            templates = self._templates[names] = [current_app.jinja_env.get_template(name) for name in names]
+        return templates
+
+    def _build_order_confirmation(self, order_data):
+        msg = Message(
+            'Order Confirmation - Thank you for your purchase!',
+            sender=current_app.config['MAIL_DEFAULT_SENDER'],
+            recipients=[order_data['email']]
+        )
+        msg.html, msg.body = self.render_order_confirmation(order_data)
+        return msg
+
+    def send_bulk(self, messages):
+        """
+        Send many messages over the shared connection
+
+        Args:
+            messages: List of flask_mail.Message
+
+        Returns:
+            list: One entry per message, None if it was sent or the exception raised
+        """
+        results = []
+        for msg in messages:
+            try:
+                self._send(msg)
+                results.append(None)
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def _send(self, msg):
+        if self._connection is None:
+            raise RuntimeError("EmailService not properly initialized")
+
+        self._connection.send(msg)
@@ -0,0 +1,245 @@
+"""
+Pipeline that submits paid orders to Winit as outbound orders
+
+worker.py fulfill-orders claims a batch of paid orders, creates the Winit
+outbound orders (one API call per order, run a few at a time) and confirms
+all of them with a single confirm call, since that endpoint takes a list of
+order numbers. When a batch confirm fails it is split in halves until the
+failing orders are isolated, so one bad order does not hold back the rest.
+Failed orders are retried with jittered backoff.
+
+Each batch records its orders by outcome, its duration and every submitted
+order's payment-to-submission lag in the metrics registry, so throughput
+(rate of fulfillment_orders_total{outcome="submitted"}), failure rate and lag
+show up on /metrics. The job only runs with WINIT_FULFILLMENT_ENABLED set,
+since it creates real outbound orders.
+"""
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import current_app
+
+from app.metrics import registry
+from app.models import Order, db
+from app.services.retry import WorkQueue
+from app.services.winit_api import WinitAPI
+
+logger = logging.getLogger('fulfillment_service')
+
+FULFILLMENT_ORDERS = registry.counter(
+    'fulfillment_orders_total', 'Claimed orders by batch outcome (submitted, retried, failed)', ('outcome',))
+FULFILLMENT_LAG = registry.histogram(
+    'fulfillment_lag_seconds', 'Time from payment to Winit submission, per submitted order',
+    buckets=(60, 300, 900, 1800, 3600, 3 * 3600, 6 * 3600, 12 * 3600, 24 * 3600, 72 * 3600))
+FULFILLMENT_BATCH_SECONDS = registry.histogram(
+    'fulfillment_batch_duration_seconds', 'Time to create and confirm one batch of orders')
+
+class WinitAPIError(Exception):
+    """Winit answered, but with a non-zero result code"""
+
+def check_winit_response(response):
+    """Return the data of a successful Winit response, raising WinitAPIError otherwise"""
+    if not isinstance(response, dict) or response.get('code') != '0':
+        code = response.get('code') if isinstance(response, dict) else None
+        msg = response.get('msg') if isinstance(response, dict) else response
+        raise WinitAPIError(f"{msg or 'Unknown error'} (Code: {code})")
+    return response.get('data') or {}
+
+class FulfillmentService:
+    """Submit paid orders to Winit in batches and report pipeline health"""
+
+    RETRY_BASE_SECONDS = 30
+    RETRY_MAX_SECONDS = 3600
+
+    def __init__(self, app=None, winit_api=None):
+        self.app = app or current_app._get_current_object()
+        self.winit_api = winit_api or WinitAPI.from_app(self.app)
+        self.batch_size = self.app.config['WINIT_FULFILLMENT_BATCH_SIZE']
+        self.concurrency = self.app.config['WINIT_FULFILLMENT_CONCURRENCY']
+        self.max_attempts = self.app.config['WINIT_FULFILLMENT_MAX_ATTEMPTS']
+        # Claimed orders stay 'paid'; the lease on next_fulfillment_at guards them
+        self.queue = WorkQueue(Order, Order.STATUS_PAID, Order.STATUS_FULFILLMENT_FAILED,
+                               retry_base=self.RETRY_BASE_SECONDS, retry_max=self.RETRY_MAX_SECONDS,
+                               next_attempt='next_fulfillment_at', attempts='fulfillment_attempts',
+                               last_error='fulfillment_error')
+
+    def process_batch(self, batch_size=None):
+        """
+        Create and confirm one batch of due orders
+
+        Returns:
+            dict: Counts of 'claimed', 'created', 'submitted', 'retried' and
+                  'failed' orders, plus 'seconds', 'throughput' (orders
+                  submitted per second), 'failure_rate' and the 'max_lag'
+                  and 'avg_lag' in seconds from payment to submission
+        """
+        started = time.monotonic()
+        stats = {'claimed': 0, 'created': 0, 'submitted': 0, 'retried': 0, 'failed': 0}
+
+        orders = self._claim(batch_size or self.batch_size)
+        stats['claimed'] = len(orders)
+        if not orders:
+            return stats
+
+        errors = {}
+
+        # Creating is one call per order; run a few at a time. The payloads
+        # are built here because the ORM session belongs to this thread.
+        # An order claimed before may have been created by a call whose
+        # response was lost, so those look their Winit order up first.
+        to_create = [order for order in orders if not order.winit_order_num]
+        payloads = [self.build_outbound_order(order) for order in to_create]
+        reconcile = [order.fulfillment_attempts > 1 for order in to_create]
+        with ThreadPoolExecutor(max_workers=max(1, self.concurrency)) as pool:
+            results = list(pool.map(self._create_outbound_order, payloads, reconcile))
+        for order, (winit_order_num, error) in zip(to_create, results):
+            if error is not None:
+                errors[order.id] = error
+                continue
+            order.winit_order_num = winit_order_num
+            stats['created'] += 1
+        # Keep the Winit order numbers even if confirming fails below, so a
+        # retry only confirms instead of creating a second outbound order
+        db.session.commit()
+
+        ready = [order for order in orders if order.id not in errors]
+        confirm_errors = self._confirm([order.winit_order_num for order in ready])
+
+        now = datetime.utcnow()
+        lags = []
+        for order in ready:
+            error = confirm_errors.get(order.winit_order_num)
+            if error is not None:
+                errors[order.id] = error
+                continue
+            order.status = Order.STATUS_SUBMITTED
+            order.submitted_at = now
+            order.fulfillment_error = None
+            lag = (now - order.created_at).total_seconds()
+            FULFILLMENT_LAG.observe(lag)
+            lags.append(lag)
+            stats['submitted'] += 1
+
+        for order in orders:
+            if order.id in errors:
+                stats[self._reschedule(order, errors[order.id])] += 1
+        db.session.commit()
+
+        stats['seconds'] = time.monotonic() - started
+        FULFILLMENT_BATCH_SECONDS.observe(stats['seconds'])
+        for outcome in ('submitted', 'retried', 'failed'):
+            if stats[outcome]:
+                FULFILLMENT_ORDERS.inc(stats[outcome], outcome=outcome)
+        stats['throughput'] = stats['submitted'] / stats['seconds'] if stats['seconds'] else 0.0
+        stats['failure_rate'] = (stats['retried'] + stats['failed']) / stats['claimed']
+        stats['max_lag'] = max(lags) if lags else 0.0
+        stats['avg_lag'] = sum(lags) / len(lags) if lags else 0.0
+        return stats
+
+    def build_outbound_order(self, order):
+        """Winit outbound order payload for an Order"""
+        data = {
+            'warehouseCode': self.app.config['WINIT_WAREHOUSE_CODE'],
+            'sellerOrderNo': order.order_number,
+            'recipientName': order.shipping_name,
+            'phoneNum': order.customer_phone,
+            'emailAddress': order.customer_email,
+            'address1': order.shipping_line1,
+            'address2': order.shipping_line2,
+            'city': order.shipping_city,
+            'state': order.shipping_state,
+            'zipCode': order.shipping_postal_code,
+            'country': order.shipping_country,
+            'productList': [{
+                'productCode': line.sku,
+                'specification': line.spu,
+                'productNum': line.quantity
+            } for line in order.lines]
+        }
+        if self.app.config.get('WINIT_DELIVERY_WAY_ID'):
+            data['deliveryWayID'] = self.app.config['WINIT_DELIVERY_WAY_ID']
+        return data
+
+    def stats(self):
+        """
+        Pipeline health from the orders table
+
+        Returns:
+            dict: Order counts by status and 'oldest_pending_seconds', the age
+                  of the oldest paid order still waiting for Winit
+        """
+        counts = dict(db.session.query(Order.status, db.func.count(Order.id)).group_by(Order.status).all())
+        oldest = db.session.query(db.func.min(Order.created_at)).filter(Order.status == Order.STATUS_PAID).scalar()
+        return {
+            'counts': counts,
+            'oldest_pending_seconds': (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0
+        }
+
+    def find_outbound_order(self, seller_order_no):
+        """
+        Winit order already created for one of our order numbers
+
+        Returns:
+            str: The Winit order number, or None if Winit has no live order for it
+        """
+        data = check_winit_response(self.winit_api.get_order_list(
+            filters={'sellerOrderNo': seller_order_no}, page_size=20))
+        for remote in data.get('list') or []:
+            if remote.get('sellerOrderNo') == seller_order_no and remote.get('status') != 'voided':
+                return remote.get('orderNum')
+        return None
+
+    def _create_outbound_order(self, payload, reconcile=False):
+        """
+        Create one outbound order; runs in a pool thread. Returns (winit_order_num, error).
+
+        With reconcile, an order Winit already has under the same sellerOrderNo
+        is reused instead of creating a second one. A failed lookup is an
+        error: creating blindly could duplicate the order.
+        """
+        try:
+            if reconcile:
+                existing = self.find_outbound_order(payload['sellerOrderNo'])
+                if existing:
+                    logger.info(f"Reusing Winit order {existing} already created for {payload['sellerOrderNo']}")
+                    return existing, None
+            data = check_winit_response(self.winit_api.create_outbound_order(payload))
+            winit_order_num = data.get('orderNum')
+            if not winit_order_num:
+                raise WinitAPIError(f"No order number returned for {payload['sellerOrderNo']}")
+            return winit_order_num, None
+        except Exception as e:
+            return None, e
+
+    def _confirm(self, order_nums):
+        """
+        Confirm Winit orders, splitting the batch to isolate failures
+
+        Returns:
+            dict: Winit order number -> error, for the orders that could not be confirmed
+        """
+        if not order_nums:
+            return {}
+        try:
+            check_winit_response(self.winit_api.confirm_order(order_nums))
+            return {}
+        except Exception as e:
+            if len(order_nums) == 1:
+                return {order_nums[0]: e}
+            middle = len(order_nums) // 2
+            errors = self._confirm(order_nums[:middle])
+            errors.update(self._confirm(order_nums[middle:]))
+            return errors
+
+    def _claim(self, batch_size):
+        """Claim due paid orders so concurrent workers never submit the same one"""
+        claimed = self.queue.claim(batch_size)
+        if not claimed:
+            return []
+        return Order.query.options(db.selectinload(Order.lines)).filter(
+            Order.id.in_(claimed)).order_by(Order.id).all()
+
+    def _reschedule(self, order, error):
+        return self.queue.reschedule(order, error, self.max_attempts,
+                                     f"Winit submission for order {order.order_number}")
@@ -0,0 +1,379 @@
+"""
+Service for finalizing paid Stripe checkout sessions into orders
+
+Finalization (recording the Order and its lines, queueing the confirmation
+email and clearing the cart) runs from a queue fed by checkout.session.completed
+webhooks and by the success page, and is processed by worker.py
+finalize-orders. The success page only reads the finalized state.
+"""
+import json
+import hashlib
+import logging
+from datetime import datetime, time, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from app.models import CheckoutFinalization, CheckoutSnapshot, Order, OrderLine, db
+from app.replica import read_session
+from app.services.cart_service import CartService, unit_amount
+from app.services.email_service import EmailService
+from app.services.retry import WorkQueue
+
+logger = logging.getLogger('order_service')
+
+# Stripe payment_status values that mean the order can be fulfilled
+PAID_STATUSES = ('paid', 'no_payment_required')
+
+class CheckoutMismatch(Exception):
+    """What would be recorded differs from what Stripe charged; retrying cannot fix it"""
+
+def extract_checkout_details(checkout_session):
+    """
+    Pull the cart id, customer contact and shipping address out of a Stripe
+    checkout session (a StripeObject or the plain dict stored from a webhook)
+
+    Returns:
+        dict: cart_session_id, email, phone, shipping_details
+    """
+    metadata = checkout_session.get('metadata') or {}
+    if isinstance(metadata, str):
+        try:
+            metadata = json.loads(metadata)
+        except ValueError:
+            metadata = {}
+
+    shipping = checkout_session.get('shipping_details') or {}
+    address = shipping.get('address') or {}
+    customer = checkout_session.get('customer_details') or {}
+
+    return {
+        'cart_session_id': metadata.get('cart_session_id'),
+        'email': customer.get('email') or 'customer@example.com',
+        'phone': customer.get('phone') or '0000000000',
+        'shipping_details': {
+            'name': shipping.get('name') or 'Customer',
+            'address': {
+                'line1': address.get('line1') or '',
+                'line2': address.get('line2') or '',
+                'city': address.get('city') or '',
+                'state': address.get('state') or '',
+                'postal_code': address.get('postal_code') or '',
+                'country': address.get('country') or ''
+            }
+        }
+    }
+
+def order_number_for(stripe_session_id, salt=0):
+    """
+    Customer-facing order number, derived from the Stripe session so retries agree on it
+
+    64 bits of the digest; salt picks another number for the rare session
+    whose number is already taken by a different session.
+    """
+    key = stripe_session_id if not salt else f"{stripe_session_id}:{salt}"
+    return 'LG' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:16].upper()
+
+class OrderService:
+    """Queue and process checkout finalization, and query the resulting orders"""
+
+    def __init__(self, app=None):
+        self.app = app or current_app._get_current_object()
+        self.queue = WorkQueue(CheckoutFinalization, CheckoutFinalization.STATUS_QUEUED,
+                               CheckoutFinalization.STATUS_FAILED,
+                               claimed_status=CheckoutFinalization.STATUS_PROCESSING)
+
+    def enqueue_finalization(self, stripe_session_id, checkout_session=None, cart_session_id=None):
+        """
+        Queue a checkout session for finalization; safe to call repeatedly
+
+        Args:
+            stripe_session_id: Stripe checkout session id
+            checkout_session: Session object from a webhook, saves a Stripe call later
+            cart_session_id: Cart id known to the caller (e.g. from the Flask session)
+
+        Returns:
+            CheckoutFinalization: The queued or already existing row
+        """
+        payload = json.dumps(checkout_session) if checkout_session is not None else None
+
+        finalization = CheckoutFinalization.query.filter_by(stripe_session_id=stripe_session_id).first()
+        if finalization is None:
+            finalization = CheckoutFinalization(
+                stripe_session_id=stripe_session_id,
+                cart_session_id=cart_session_id,
+                payload=payload
+            )
+            try:
+                with db.session.begin_nested():
+                    db.session.add(finalization)
+            except IntegrityError:
+                # Webhook and success page raced; the other insert won
+                finalization = CheckoutFinalization.query.filter_by(stripe_session_id=stripe_session_id).one()
+
+        if finalization.status != CheckoutFinalization.STATUS_FINALIZED:
+            if payload and not finalization.payload:
+                finalization.payload = payload
+            if cart_session_id and not finalization.cart_session_id:
+                finalization.cart_session_id = cart_session_id
+        db.session.commit()
+        return finalization
+
+    def record_checkout_snapshot(self, stripe_session_id, cart_session_id, payload):
+        """
+        Store the cart lines a checkout session was created for; safe to call repeatedly
+
+        Args:
+            stripe_session_id: Stripe checkout session id
+            cart_session_id: Cart the session was created from
+            payload: CartService.get_checkout_payload() result sent to Stripe
+
+        Returns:
+            CheckoutSnapshot: The stored or already existing snapshot
+        """
+        snapshot = CheckoutSnapshot(
+            stripe_session_id=stripe_session_id,
+            cart_session_id=cart_session_id,
+            items=json.dumps(payload['items']),
+            amount_total=payload['amount_total'],
+            currency=payload['currency']
+        )
+        try:
+            with db.session.begin_nested():
+                db.session.add(snapshot)
+        except IntegrityError:
+            # A retried create returned the same session (idempotency key)
+            snapshot = CheckoutSnapshot.query.filter_by(stripe_session_id=stripe_session_id).one()
+        db.session.commit()
+        return snapshot
+
+    def prune_checkout_snapshots(self, max_age, batch_size=500):
+        """
+        Delete snapshots older than max_age seconds in bounded batches
+
+        Snapshots of paid sessions are copied into orders when finalized; the
+        rest belong to checkouts that were abandoned.
+
+        Returns:
+            int: Number of snapshots deleted
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+        deleted = 0
+        while True:
+            ids = [row.id for row in db.session.query(CheckoutSnapshot.id).filter(
+                CheckoutSnapshot.created_at < cutoff).limit(batch_size).all()]
+            if not ids:
+                return deleted
+            deleted += CheckoutSnapshot.query.filter(CheckoutSnapshot.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+
+    def get_checkout_snapshot(self, stripe_session_id):
+        """Get the cart snapshot stored when a checkout session was created, if any"""
+        return CheckoutSnapshot.query.filter_by(stripe_session_id=stripe_session_id).first()
+
+    def get_finalization(self, stripe_session_id):
+        """Get the finalization state for a checkout session, if queued"""
+        return CheckoutFinalization.query.filter_by(stripe_session_id=stripe_session_id).first()
+
+    def process_pending(self, batch_size=20):
+        """
+        Finalize one batch of queued checkout sessions
+
+        Returns:
+            dict: Counts of 'finalized', 'retried' and 'failed' sessions
+        """
+        stats = {'finalized': 0, 'retried': 0, 'failed': 0}
+        for finalization in self._claim(batch_size):
+            try:
+                self.finalize(finalization)
+                stats['finalized'] += 1
+            except CheckoutMismatch as e:
+                db.session.rollback()
+                finalization.status = CheckoutFinalization.STATUS_FAILED
+                finalization.last_error = str(e)[:1000]
+                db.session.commit()
+                logger.error(f"Refusing to finalize checkout {finalization.stripe_session_id}: {e}")
+                stats['failed'] += 1
+            except Exception as e:
+                db.session.rollback()
+                stats[self._reschedule(finalization, e)] += 1
+        return stats
+
+    def finalize(self, finalization):
+        """
+        Turn a paid checkout session into a finalized order
+
+        Idempotent: a finalized row is left untouched, and the email, cart
+        removal and state change are keyed by the Stripe session id.
+
+        The lines come from the snapshot taken when the session was created,
+        so anything added to the cart afterwards is not recorded. Sessions
+        without a snapshot fall back to the persisted cart. Either way the
+        total must match the session's amount_total.
+
+        Raises:
+            CheckoutMismatch: The lines do not add up to what Stripe charged
+        """
+        if finalization.status == CheckoutFinalization.STATUS_FINALIZED:
+            return finalization
+
+        checkout_session = finalization.payload_dict
+        if checkout_session is None:
+            checkout_session = self._retrieve_checkout_session(finalization.stripe_session_id)
+
+        if checkout_session.get('payment_status') not in PAID_STATUSES:
+            raise RuntimeError(f"Payment not completed (status {checkout_session.get('payment_status')})")
+
+        details = extract_checkout_details(checkout_session)
+        snapshot = CheckoutSnapshot.query.filter_by(stripe_session_id=finalization.stripe_session_id).first()
+        cart_session_id = (details['cart_session_id'] or finalization.cart_session_id
+                           or (snapshot.cart_session_id if snapshot else None))
+        if not cart_session_id:
+            raise LookupError('Could not identify the cart for this checkout session')
+
+        cart_service = CartService(self.app)
+        if snapshot is not None:
+            items = snapshot.items_list
+        else:
+            items = [item.to_dict() for item in cart_service.get_persisted_items(cart_session_id)]
+        if not items:
+            raise LookupError(f"No cart items found for cart {cart_session_id}")
+
+        charged = checkout_session.get('amount_total')
+        if charged is None and snapshot is None:
+            raise CheckoutMismatch('Session has no amount_total and no snapshot to check the cart against')
+        expected = sum(unit_amount(item['price']) * item['quantity'] for item in items)
+        if charged is not None and charged != expected:
+            raise CheckoutMismatch(f"Stripe charged {charged} but the lines add up to {expected}")
+        total = sum(item['price'] * item['quantity'] for item in items)
+        order = self._record_order(finalization.stripe_session_id, details, items, total,
+                                   checkout_session.get('currency') or (snapshot.currency if snapshot else None))
+        order_number = order.order_number
+
+        EmailService.from_app(self.app).queue_order_confirmation({
+            'email': details['email'],
+            'items': items,
+            'total': total,
+            'shipping_details': details['shipping_details'],
+            'order_number': order_number
+        }, commit=False)
+
+        finalization.cart_session_id = cart_session_id
+        finalization.order_number = order_number
+        finalization.customer_email = details['email']
+        finalization.total = total
+        finalization.details = json.dumps({
+            'items': items,
+            'shipping_details': details['shipping_details'],
+            'phone': details['phone']
+        })
+        finalization.status = CheckoutFinalization.STATUS_FINALIZED
+        finalization.finalized_at = datetime.utcnow()
+        finalization.last_error = None
+        db.session.commit()
+        logger.info(f"Finalized order {order_number} for {details['email']} ({len(items)} lines, total {total:.2f})")
+
+        # The order is committed; a failure to empty the cart must not send
+        # the finalized row back to the retry queue. compact-carts removes
+        # the leftover cart once it expires.
+        try:
+            cart_service.clear(cart_session_id)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Finalized order {order_number} but could not clear cart {cart_session_id}: {e}")
+        return finalization
+
+    def _record_order(self, stripe_session_id, details, items, total, currency=None):
+        """
+        Add the Order and its lines to the current transaction
+
+        The lines go in as one executemany; the caller commits them together
+        with the finalization state.
+        """
+        address = details['shipping_details']['address']
+        order_number = order_number_for(stripe_session_id)
+        salt = 0
+        # A number held by another session would fail every retry on the
+        # unique constraint; step to the next derived number instead
+        while db.session.query(Order.stripe_session_id).filter(
+                Order.order_number == order_number, Order.stripe_session_id != stripe_session_id).first():
+            salt += 1
+            order_number = order_number_for(stripe_session_id, salt)
+
+        order = Order(
+            order_number=order_number,
+            stripe_session_id=stripe_session_id,
+            customer_email=details['email'],
+            customer_phone=details['phone'],
+            shipping_name=details['shipping_details']['name'],
+            shipping_line1=address['line1'],
+            shipping_line2=address['line2'],
+            shipping_city=address['city'],
+            shipping_state=address['state'],
+            shipping_postal_code=address['postal_code'],
+            shipping_country=address['country'][:2],
+            currency=currency or 'usd',
+            total=total,
+            item_count=sum(item['quantity'] for item in items)
+        )
+        db.session.add(order)
+        db.session.flush()
+
+        db.session.bulk_insert_mappings(OrderLine, [{
+            'order_id': order.id,
+            'sku': item['sku'],
+            'spu': item['spu'],
+            'title': item['title'],
+            'price': item['price'],
+            'quantity': item['quantity'],
+            'thumbnail': item['thumbnail']
+        } for item in items])
+        return order
+
+    def get_order(self, order_number):
+        """Get an order by its order number"""
+        return Order.query.filter_by(order_number=order_number).first()
+
+    def orders_pending_outbound(self, limit=100):
+        """Paid orders not yet submitted to Winit, oldest first"""
+        return Order.query.filter_by(status=Order.STATUS_PAID) \
+            .order_by(Order.created_at).limit(limit).all()
+
+    # Reporting reads below may be served by the read replica, so they can
+    # trail the primary by up to REPLICA_MAX_LAG_SECONDS
+
+    def orders_created_between(self, start, end, status=None):
+        """Orders created in [start, end), newest first, optionally in one status"""
+        query = read_session().query(Order).filter(Order.created_at >= start, Order.created_at < end)
+        if status:
+            query = query.filter(Order.status == status)
+        return query.order_by(Order.created_at.desc()).all()
+
+    def todays_orders(self, status=None):
+        """Orders created since midnight UTC"""
+        start = datetime.combine(datetime.utcnow().date(), time.min)
+        return self.orders_created_between(start, start + timedelta(days=1), status)
+
+    def orders_for_customer(self, email, limit=50):
+        """A customer's most recent orders"""
+        return read_session().query(Order).filter_by(customer_email=email) \
+            .order_by(Order.created_at.desc()).limit(limit).all()
+
+    def _retrieve_checkout_session(self, stripe_session_id):
+        import stripe
+
+        stripe.api_key = self.app.config['STRIPE_SECRET_KEY']
+        return stripe.checkout.Session.retrieve(stripe_session_id)
+
+    def _claim(self, batch_size):
+        """Claim due finalizations so concurrent workers never process the same one"""
+        claimed = self.queue.claim(batch_size)
+        if not claimed:
+            return []
+        return CheckoutFinalization.query.filter(
+            CheckoutFinalization.id.in_(claimed)).order_by(CheckoutFinalization.id).all()
+
+    def _reschedule(self, finalization, error):
+        outcome = self.queue.reschedule(finalization, error, self.app.config['ORDER_FINALIZATION_MAX_ATTEMPTS'],
+                                        f"finalizing checkout {finalization.stripe_session_id}")
+        db.session.commit()
+        return outcome
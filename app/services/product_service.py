@@ -6,6 +6,10 @@ from .winit_api import WinitAPI
 
 logger = logging.getLogger('product_service')
 
+# Parsed fallback catalogs by path: (mtime, products). Parsed once per process,
+# or once in the uWSGI master by app.warmup and shared with the workers.
+_fallback_cache = {}
+
 class ProductService:
     """Service for retrieving products with fallback mechanism"""
     
@@ -17,7 +21,7 @@ class ProductService:
         
     @staticmethod
     def load_fallback_products(fallback_file=None):
-        """Load products from fallback JSON file"""
+        """Load products from fallback JSON file (parsed again only when it changes)"""
         try:
             if has_app_context():
                 fallback_file = fallback_file or os.path.join(
@@ -31,9 +35,15 @@ class ProductService:
                 else:
                     logger.error(f"Fallback file not found: {fallback_file}")
                 return []
-                
+
+            mtime = os.path.getmtime(fallback_file)
+            cached = _fallback_cache.get(fallback_file)
+            if cached and cached[0] == mtime:
+                return cached[1]
+
             with open(fallback_file, 'r', encoding='utf-8') as f:
                 products = json.load(f)
+            _fallback_cache[fallback_file] = (mtime, products)
                 
             if has_app_context():
                 current_app.logger.info(f"Loaded {len(products)} products from fallback file")
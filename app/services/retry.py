@@ -0,0 +1,195 @@
+"""
+Retries with jittered exponential backoff
+
+RetryPolicy is for calls made inside a request handler, where a retry must
+never hold the worker for longer than the request can afford. WorkQueue is
+for the tables drained by worker.py jobs, where a failed row is retried
+later by rescheduling it.
+"""
+import time
+import random
+import logging
+from datetime import datetime, timedelta
+
+from app.metrics import registry
+from app.models import db
+
+logger = logging.getLogger('retry')
+
+RETRY_ATTEMPTS = registry.counter(
+    'retry_attempts_total', 'Attempts made under a request-path retry policy', ('policy',))
+RETRY_RETRIES = registry.counter(
+    'retry_retries_total', 'Attempts that failed with a retryable error and were retried', ('policy',))
+RETRY_OUTCOMES = registry.counter(
+    'retry_calls_total', 'Calls under a retry policy by outcome (success, exhausted, error)', ('policy', 'outcome'))
+
+class RetryBudgetExceeded(Exception):
+    """All attempts failed, or the next wait would overrun the deadline"""
+
+    def __init__(self, name, attempts, last_error):
+        super().__init__(f"{name} failed after {attempts} attempt(s): {last_error}")
+        self.attempts = attempts
+        self.last_error = last_error
+
+class RetryPolicy:
+    """
+    Call a function, retrying retryable errors until attempts or time run out
+
+    Delays use "full jitter": a random wait between 0 and
+    min(max_delay, base_delay * 2 ** retry). Before each wait the policy checks
+    the remaining deadline and gives up early rather than sleeping past it.
+    With timeout_arg set, each attempt also gets the remaining deadline as
+    that keyword argument, so a hanging call cannot outlive the budget.
+    Attempts, retries and outcomes go to /metrics labelled with the policy name.
+    """
+
+    # Shortest timeout handed to an attempt
+    MIN_ATTEMPT_TIMEOUT = 0.1
+
+    def __init__(self, name, retry_on, max_attempts=3, base_delay=0.25, max_delay=2.0,
+                 deadline=5.0, timeout_arg=None, sleep=time.sleep, clock=time.monotonic):
+        self.name = name
+        self.retry_on = retry_on
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.timeout_arg = timeout_arg
+        self._sleep = sleep
+        self._clock = clock
+
+    def call(self, func, *args, **kwargs):
+        """
+        Run func(*args, **kwargs) under the policy
+
+        Non-retryable exceptions propagate immediately.
+
+        Raises:
+            RetryBudgetExceeded: The last retryable error, once attempts or the deadline are used up
+        """
+        start = self._clock()
+        attempt = 0
+        while True:
+            attempt += 1
+            RETRY_ATTEMPTS.inc(policy=self.name)
+            if self.timeout_arg:
+                remaining = self.deadline - (self._clock() - start)
+                kwargs[self.timeout_arg] = max(remaining, self.MIN_ATTEMPT_TIMEOUT)
+            try:
+                result = func(*args, **kwargs)
+            except self.retry_on as e:
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                elapsed = self._clock() - start
+                if attempt >= self.max_attempts or elapsed + delay > self.deadline:
+                    RETRY_OUTCOMES.inc(policy=self.name, outcome='exhausted')
+                    logger.error(f"{self.name}: giving up after {attempt} attempt(s) "
+                                 f"in {elapsed:.2f}s: {e}")
+                    raise RetryBudgetExceeded(self.name, attempt, e) from e
+                RETRY_RETRIES.inc(policy=self.name)
+                logger.warning(f"{self.name}: attempt {attempt}/{self.max_attempts} failed, "
+                               f"retrying in {delay:.2f}s: {e}")
+                self._sleep(delay)
+                continue
+            except Exception:
+                RETRY_OUTCOMES.inc(policy=self.name, outcome='error')
+                raise
+            RETRY_OUTCOMES.inc(policy=self.name, outcome='success')
+            return result
+
+class WorkQueue:
+    """
+    Claim, lease and backoff for a table of rows processed by a worker job
+
+    Due rows are claimed with a conditional UPDATE on the status and
+    next-attempt values that were read, so only one of several concurrent
+    workers wins each row. Claiming pushes the next attempt out by the lease
+    and counts the attempt, so a row whose worker crashed mid-way becomes due
+    again once the lease runs out. Failed rows are rescheduled with jittered
+    exponential backoff until max_attempts, then marked failed.
+    """
+
+    def __init__(self, model, pending_status, failed_status, claimed_status=None, lease_seconds=300,
+                 retry_base=2, retry_max=600, next_attempt='next_attempt_at', attempts='attempts',
+                 last_error='last_error'):
+        self.model = model
+        self.pending_status = pending_status
+        self.failed_status = failed_status
+        # None: claimed rows keep the pending status (the lease alone guards them)
+        self.claimed_status = claimed_status
+        self.lease_seconds = lease_seconds
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.next_attempt = next_attempt
+        self.attempts = attempts
+        self.last_error = last_error
+
+    def claim(self, batch_size, order_by=None):
+        """
+        Claim up to batch_size due rows and commit the claims
+
+        Args:
+            batch_size: Maximum number of rows to claim
+            order_by: Column the due rows are picked by (default: the next-attempt column)
+
+        Returns:
+            list: Ids of the rows this worker won
+        """
+        model = self.model
+        next_attempt = getattr(model, self.next_attempt)
+        statuses = [self.pending_status] + ([self.claimed_status] if self.claimed_status else [])
+        now = datetime.utcnow()
+        due = model.query.filter(
+            model.status.in_(statuses),
+            next_attempt <= now
+        ).order_by(order_by if order_by is not None else next_attempt).limit(batch_size).all()
+
+        claimed = []
+        values = {
+            self.next_attempt: now + timedelta(seconds=self.lease_seconds),
+            self.attempts: getattr(model, self.attempts) + 1
+        }
+        if self.claimed_status:
+            values['status'] = self.claimed_status
+        for row in due:
+            won = model.query.filter_by(**{
+                'id': row.id,
+                'status': row.status,
+                self.next_attempt: getattr(row, self.next_attempt)
+            }).update(values, synchronize_session=False)
+            if won:
+                claimed.append(row.id)
+        db.session.commit()
+        return claimed
+
+    def backoff(self, attempts):
+        """Seconds until the next attempt: exponential in attempts, capped, with jitter"""
+        return min(self.retry_base * 2 ** (attempts - 1), self.retry_max) * random.uniform(0.5, 1.0)
+
+    def reschedule(self, row, error, max_attempts, description):
+        """
+        Record a failed attempt and schedule the next one, or give up
+
+        The caller commits.
+
+        Args:
+            row: The claimed row that failed
+            error: The exception (or message) to record
+            max_attempts: Attempts after which the row is marked failed
+            description: What the row is, for the log (e.g. "outbox email 12")
+
+        Returns:
+            str: 'retried' or 'failed'
+        """
+        attempts = getattr(row, self.attempts)
+        setattr(row, self.last_error, str(error)[:1000])
+
+        if attempts >= max_attempts:
+            row.status = self.failed_status
+            logger.error(f"Giving up on {description} after {attempts} attempts: {error}")
+            return 'failed'
+
+        delay = self.backoff(attempts)
+        row.status = self.pending_status
+        setattr(row, self.next_attempt, datetime.utcnow() + timedelta(seconds=delay))
+        logger.warning(f"Attempt {attempts} at {description} failed, retrying in {delay:.0f}s: {error}")
+        return 'retried'
@@ -0,0 +1,70 @@
+"""
+Stripe HTTP client whose timeout can be narrowed for a single call
+
+stripe-python takes its timeout from the process-wide default HTTP client,
+not per request. The client installed here is stripe's own RequestsClient,
+given a DeadlineSession through its public session argument: the calling
+thread can override the timeout of the requests the session sends for one
+call, so a RetryPolicy can give each attempt only what is left of its
+deadline. The override is applied in requests.Session.request, so it holds
+whatever stripe-python does with its own timeout; a call that never reaches
+the session is logged as an error rather than running without a deadline
+unnoticed. Imported on first checkout, like stripe itself.
+"""
+import logging
+import threading
+from contextlib import contextmanager
+
+import requests
+import stripe
+from stripe.http_client import RequestsClient
+
+logger = logging.getLogger('stripe_client')
+
+class DeadlineSession(requests.Session):
+    """requests.Session with a per-thread timeout override"""
+
+    def __init__(self):
+        super().__init__()
+        self._override = threading.local()
+
+    def request(self, method, url, **kwargs):
+        timeout = getattr(self._override, 'timeout', None)
+        if timeout is not None:
+            kwargs['timeout'] = timeout
+            self._override.applied = True
+        return super().request(method, url, **kwargs)
+
+    @contextmanager
+    def timeout(self, seconds):
+        """
+        Use seconds as the timeout for requests sent by this thread inside the block
+
+        Yields:
+            function: Returns whether a request in the block got the override
+        """
+        self._override.timeout = seconds
+        self._override.applied = False
+        try:
+            yield lambda: self._override.applied
+        finally:
+            self._override.timeout = None
+
+def http_client():
+    """The process's Stripe HTTP client, installed on first use and again after a fork reset"""
+    client = stripe.default_http_client
+    if not isinstance(getattr(client, 'deadline_session', None), DeadlineSession):
+        session = DeadlineSession()
+        client = RequestsClient(session=session)
+        client.deadline_session = session
+        stripe.default_http_client = client
+    return client
+
+def create_checkout_session(timeout=None, **params):
+    """stripe.checkout.Session.create, giving up on the HTTP call after timeout seconds"""
+    with http_client().deadline_session.timeout(timeout) as applied:
+        checkout_session = stripe.checkout.Session.create(**params)
+        if timeout is not None and not applied():
+            logger.error("Stripe did not send its request through the deadline session; "
+                         "the per-attempt timeout is not enforced with this stripe-python version")
+    return checkout_session
@@ -0,0 +1,151 @@
+"""
+Incremental sync of Winit order status and tracking numbers
+
+worker.py sync-tracking asks Winit for the orders updated since the stored
+cursor, a page at a time through get_order_list, and applies the changes
+with one bulk UPDATE per page. The number of calls grows with the number of
+status changes, not with the number of open orders, so nothing is polled
+one by one with get_order_details.
+"""
+import logging
+from datetime import datetime, timedelta
+from flask import current_app
+
+from app.models import Order, SyncCursor, db
+from app.services.fulfillment_service import check_winit_response
+from app.services.winit_api import WinitAPI
+
+logger = logging.getLogger('tracking_service')
+
+# Winit order status -> our Order status. Statuses not listed only update
+# Order.winit_status.
+WINIT_STATUS_MAP = {
+    'shipped': Order.STATUS_SHIPPED,
+    'delivered': Order.STATUS_SHIPPED,
+    'voided': Order.STATUS_CANCELLED,
+    'cancelled': Order.STATUS_CANCELLED,
+}
+
+class TrackingSyncService:
+    """Pull order status changes from Winit and write them back in bulk"""
+
+    CURSOR_NAME = 'winit_order_updates'
+    # Winit's own timestamp format; the cursor is only ever compared by Winit
+    TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+    def __init__(self, app=None, winit_api=None):
+        self.app = app or current_app._get_current_object()
+        self.winit_api = winit_api or WinitAPI.from_app(self.app)
+        self.page_size = self.app.config['WINIT_TRACKING_PAGE_SIZE']
+        self.lookback_days = self.app.config['WINIT_TRACKING_LOOKBACK_DAYS']
+
+    def sync(self, page_size=None, max_pages=None):
+        """
+        Apply every order update Winit reports since the last sync
+
+        Winit lists orders by (updateTime, orderNum). Pages are read by
+        keyset: each page asks again from the last row's updateTime and
+        skips the rows up to that (updateTime, orderNum), instead of moving
+        to the next page offset, so an order updated while the sync runs
+        moves to the end of the list rather than shifting another order out
+        of the page being read. Only when a whole page shares one second
+        does the sync step through that second by page number.
+
+        The stored cursor is the latest updateTime applied and is written
+        only once the pass has finished. The next sync starts at that same
+        second (Winit's filter is inclusive), so updates sharing the
+        boundary second are never skipped; re-applying one is a no-op.
+
+        Returns:
+            dict: 'pages', 'seen' and 'updated' counts, 'shipped' and
+                  'cancelled' transitions and the new 'cursor'
+        """
+        page_size = page_size or self.page_size
+        stats = {'pages': 0, 'seen': 0, 'updated': 0, 'shipped': 0, 'cancelled': 0}
+
+        cursor = db.session.get(SyncCursor, self.CURSOR_NAME)
+        if cursor is None:
+            cursor = SyncCursor(name=self.CURSOR_NAME)
+            db.session.add(cursor)
+        since = cursor.value or (datetime.now() - timedelta(days=self.lookback_days)).strftime(self.TIME_FORMAT)
+        # Keyset position: everything up to (since, after_num) is applied
+        after_num = ''
+        page_no = 1
+        finished = False
+        while max_pages is None or stats['pages'] < max_pages:
+            data = check_winit_response(self.winit_api.get_order_list(
+                filters={'updateTimeStart': since}, page_no=page_no, page_size=page_size))
+            orders = sorted(data.get('list') or [], key=self._position)
+            stats['pages'] += 1
+
+            new = [o for o in orders if self._position(o) > (since, after_num)]
+            stats['seen'] += len(new)
+            self._apply(new, stats)
+            db.session.commit()
+
+            total = (data.get('pageParams') or {}).get('totalCount')
+            if len(orders) < page_size or (total is not None and page_no * page_size >= total):
+                finished = True
+                if new:
+                    since, after_num = self._position(new[-1])
+                break
+
+            last_time, last_num = self._position(orders[-1])
+            if last_time == since:
+                # The whole page is in the boundary second: page through it
+                page_no += 1
+                after_num = max(after_num, last_num)
+            else:
+                since, after_num = last_time, last_num
+                page_no = 1
+
+        if not finished:
+            logger.info(f"Stopped after {stats['pages']} page(s) at {since}; the next sync continues from there")
+        cursor.value = since
+        db.session.commit()
+        stats['cursor'] = since
+        return stats
+
+    @staticmethod
+    def _position(winit_order):
+        return (winit_order.get('updateTime') or '', winit_order.get('orderNum') or '')
+
+    def _apply(self, winit_orders, stats):
+        """Bulk-update the local orders matching one page of Winit orders"""
+        by_num = {o['orderNum']: o for o in winit_orders if o.get('orderNum')}
+        if not by_num:
+            return
+
+        rows = db.session.query(
+            Order.id, Order.winit_order_num, Order.status, Order.winit_status, Order.tracking_number
+        ).filter(Order.winit_order_num.in_(list(by_num))).all()
+
+        now = datetime.utcnow()
+        mappings = []
+        for row in rows:
+            remote = by_num[row.winit_order_num]
+            winit_status = remote.get('status')
+            tracking_number = remote.get('trackingNo') or row.tracking_number
+            mapping = {}
+            if winit_status != row.winit_status:
+                mapping['winit_status'] = winit_status
+            if tracking_number != row.tracking_number:
+                mapping['tracking_number'] = tracking_number
+
+            status = WINIT_STATUS_MAP.get(winit_status)
+            # Only orders Winit accepted move on; shipped/cancelled are final
+            if status and status != row.status and row.status == Order.STATUS_SUBMITTED:
+                mapping['status'] = status
+                if status == Order.STATUS_SHIPPED:
+                    mapping['shipped_at'] = now
+                    stats['shipped'] += 1
+                else:
+                    stats['cancelled'] += 1
+
+            if mapping:
+                mapping['id'] = row.id
+                mappings.append(mapping)
+
+        if mappings:
+            db.session.bulk_update_mappings(Order, mappings)
+            stats['updated'] += len(mappings)
@@ -0,0 +1,104 @@
+"""
+Service for storing and processing Stripe webhook events
+
+The webhook endpoint only verifies the signature, stores the event once per
+Stripe event id and acknowledges it. Stripe retries and duplicate deliveries
+hit the unique event id and are acknowledged without doing any work. The
+stored events are handled in order of arrival by worker.py process-webhooks,
+so slow downstream work never holds up the webhook response.
+"""
+import json
+import logging
+from datetime import datetime
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from app.models import StripeWebhookEvent, db
+from app.services.retry import WorkQueue
+
+logger = logging.getLogger('webhook_service')
+
+class WebhookService:
+    """Record verified Stripe events and dispatch them to their handlers"""
+
+    def __init__(self, app=None):
+        self.app = app or current_app._get_current_object()
+        self.queue = WorkQueue(StripeWebhookEvent, StripeWebhookEvent.STATUS_PENDING,
+                               StripeWebhookEvent.STATUS_FAILED, claimed_status=StripeWebhookEvent.STATUS_PROCESSING)
+        self.handlers = {
+            'checkout.session.completed': self._handle_checkout_session_completed,
+        }
+
+    def record_event(self, event):
+        """
+        Store a verified event unless it has been seen before
+
+        Args:
+            event: stripe.Event (or dict) returned by stripe.Webhook.construct_event
+
+        Returns:
+            tuple: (StripeWebhookEvent, created) where created is False for a duplicate
+        """
+        stored = StripeWebhookEvent(
+            event_id=event['id'],
+            type=event['type'],
+            stripe_created=event.get('created'),
+            payload=json.dumps(event)
+        )
+        # Event types nobody handles are kept for auditing but never queued
+        if event['type'] not in self.handlers:
+            stored.status = StripeWebhookEvent.STATUS_PROCESSED
+            stored.processed_at = datetime.utcnow()
+
+        try:
+            with db.session.begin_nested():
+                db.session.add(stored)
+        except IntegrityError:
+            db.session.commit()
+            return StripeWebhookEvent.query.filter_by(event_id=event['id']).one(), False
+
+        db.session.commit()
+        return stored, True
+
+    def process_pending(self, batch_size=50):
+        """
+        Handle one batch of stored events, oldest first
+
+        Returns:
+            dict: Counts of 'processed', 'retried' and 'failed' events
+        """
+        stats = {'processed': 0, 'retried': 0, 'failed': 0}
+        for stored in self._claim(batch_size):
+            try:
+                self.handlers[stored.type](stored.payload_dict['data']['object'])
+                stored.status = StripeWebhookEvent.STATUS_PROCESSED
+                stored.processed_at = datetime.utcnow()
+                stored.last_error = None
+                db.session.commit()
+                stats['processed'] += 1
+            except Exception as e:
+                db.session.rollback()
+                stats[self._reschedule(stored, e)] += 1
+        return stats
+
+    def _handle_checkout_session_completed(self, checkout_session):
+        from app.services.order_service import OrderService
+
+        logger.info(f"Payment successful for session {checkout_session['id']}")
+        OrderService(self.app).enqueue_finalization(checkout_session['id'], checkout_session=checkout_session)
+
+    def _claim(self, batch_size):
+        """Claim due events so concurrent workers never handle the same one"""
+        claimed = self.queue.claim(batch_size, order_by=StripeWebhookEvent.id)
+        if not claimed:
+            return []
+        # Stripe's creation time first: events can arrive out of order
+        return StripeWebhookEvent.query.filter(
+            StripeWebhookEvent.id.in_(claimed)
+        ).order_by(StripeWebhookEvent.stripe_created, StripeWebhookEvent.id).all()
+
+    def _reschedule(self, stored, error):
+        outcome = self.queue.reschedule(stored, error, self.app.config['STRIPE_WEBHOOK_MAX_ATTEMPTS'],
+                                        f"webhook event {stored.event_id} ({stored.type})")
+        db.session.commit()
+        return outcome
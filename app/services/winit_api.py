@@ -1,15 +1,75 @@
 import hashlib
 import json
 import logging
+import os
+import time
 from datetime import datetime
-import requests
 from flask import current_app, has_app_context
 import socket
 from urllib.parse import urlparse
+from app.instrumentation import timed
+from app.metrics import registry, SIZE_BUCKETS
+
+WINIT_REQUESTS = registry.counter(
+    'winit_requests_total', 'Winit API calls made', ('action',))
+WINIT_ERRORS = registry.counter(
+    'winit_request_errors_total', 'Failed Winit API calls by error class (timeout, connection, http, api, other)',
+    ('action', 'error'))
+WINIT_LATENCY = registry.histogram(
+    'winit_request_duration_seconds', 'Winit API call latency in seconds', ('action',))
+WINIT_REQUEST_BYTES = registry.histogram(
+    'winit_request_bytes', 'Winit API request body size in bytes', ('action',), SIZE_BUCKETS)
+WINIT_RESPONSE_BYTES = registry.histogram(
+    'winit_response_bytes', 'Winit API response body size in bytes', ('action',), SIZE_BUCKETS)
 
 # Configure logging
 logger = logging.getLogger('winit_api')
 
+_http = None
+_http_pid = None
+
+def http_session():
+    """
+    This process's keep-alive session for Winit calls
+
+    Created on first use in each process, so a forked uWSGI worker never
+    shares the master's sockets (app.warmup also resets it after fork).
+    """
+    global _http, _http_pid
+    if _http is None or _http_pid != os.getpid():
+        # requests is imported on the first call, not when a worker starts
+        import requests
+        _http, _http_pid = requests.Session(), os.getpid()
+    return _http
+
+def reset_http_session():
+    """Drop the current session; the next call opens a fresh pool"""
+    global _http
+    _http = None
+
+def get_cached_delivery_methods(app, warehouse_code, timeout=30):
+    """
+    Delivery methods for a warehouse, cached per process
+
+    Successful answers are kept for WINIT_DELIVERY_METHODS_CACHE_SECONDS so the
+    checkout page does not call Winit for every visitor. Failures are not
+    cached and raise like WinitAPI calls do.
+
+    Returns:
+        list: Delivery methods (the 'data' of queryDeliveryWay)
+    """
+    cache = app.extensions.setdefault('winit_delivery_methods', {})
+    cached = cache.get(warehouse_code)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+
+    response = WinitAPI.from_app(app).get_delivery_methods(warehouse_code, timeout=timeout)
+    methods = response.get('data', []) if isinstance(response, dict) else []
+    if isinstance(response, dict) and response.get('code') == '0':
+        ttl = app.config.get('WINIT_DELIVERY_METHODS_CACHE_SECONDS', 900)
+        cache[warehouse_code] = (time.monotonic() + ttl, methods)
+    return methods
+
 class WinitAPI:
     """Service class for interacting with the Winit API"""
     
@@ -29,8 +89,14 @@ class WinitAPI:
             token=app.config['WINIT_TOKEN']
         )
 
-    def _generate_sign(self, params):
-        """Generate API signature matching the API requirements"""
+    def _generate_sign(self, params, data_json=None):
+        """Generate API signature matching the API requirements
+
+        Args:
+            params: Request parameters
+            data_json: params['data'] already serialized compactly, so it is
+                       not encoded a second time (see _prepare_request)
+        """
         # Create clean params copy
         param_copy = {k: v for k, v in params.items() if k not in ['sign', 'language']}
         
@@ -42,7 +108,9 @@ class WinitAPI:
             value = param_copy[key]
             if key == 'data':
                 # Ensure consistent JSON serialization
-                sign_string += key + json.dumps(value, separators=(',', ':'))
+                if data_json is None:
+                    data_json = json.dumps(value, separators=(',', ':'))
+                sign_string += key + data_json
             else:
                 sign_string += key + str(value)
                 
@@ -52,6 +120,36 @@ class WinitAPI:
         # Generate MD5 hash and convert to uppercase
         return hashlib.md5(sign_string.encode('utf-8')).hexdigest().upper()
 
+    def _prepare_request(self, action, data=None):
+        """
+        Build the signed request body for an action
+
+        The data payload is serialized once and the same text is used for the
+        signature and spliced into the body, so large order payloads are not
+        encoded twice. The body is the compact JSON the signature is computed
+        over; Winit parses it like any other JSON.
+
+        Returns:
+            bytes: JSON request body
+        """
+        data_json = json.dumps(data or {}, separators=(',', ':'))
+        params = {
+            'action': action,
+            'app_key': self.app_key,
+            'data': data or {},
+            'format': 'json',
+            'language': 'zh_CN',
+            'platform': self.platform,
+            'sign_method': 'md5',
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'version': '1.0'
+        }
+        params['sign'] = self._generate_sign(params, data_json)
+        del params['data']
+
+        envelope = json.dumps(params, separators=(',', ':'))
+        return f'{envelope[:-1]},"data":{data_json}}}'.encode('utf-8')
+
     def _make_request(self, action, data=None, timeout=30):
         """Make a request to the Winit API
         
@@ -68,20 +166,12 @@ class WinitAPI:
             Timeout: If the request times out
             HTTPError: If the API returns an error status code
         """
-        params = {
-            'action': action,
-            'app_key': self.app_key,
-            'data': data or {},
-            'format': 'json',
-            'language': 'zh_CN',
-            'platform': self.platform,
-            'sign_method': 'md5',
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'version': '1.0'
-        }
-        
-        params['sign'] = self._generate_sign(params)
-        
+        import requests
+
+        body = self._prepare_request(action, data)
+
+        WINIT_REQUESTS.inc(action=action)
+        start = time.perf_counter()
         try:
             # Log the request - use Flask's logger if in app context, otherwise use standard logger
             log_message = f"Making Winit API request to {self.base_url} for action {action}"
@@ -91,10 +181,18 @@ class WinitAPI:
                 self.logger.info(log_message)
                 
             # Make the request with a longer timeout
-            response = requests.post(self.base_url, json=params, timeout=timeout)
+            with timed('winit'):
+                response = http_session().post(self.base_url, data=body, timeout=timeout,
+                                               headers={'Content-Type': 'application/json'})
+            WINIT_REQUEST_BYTES.observe(len(body), action=action)
+            WINIT_RESPONSE_BYTES.observe(len(response.content), action=action)
             response.raise_for_status()
-            return response.json()
+            result = response.json()
+            if not isinstance(result, dict) or result.get('code') != '0':
+                WINIT_ERRORS.inc(action=action, error='api')
+            return result
         except requests.exceptions.Timeout:
+            WINIT_ERRORS.inc(action=action, error='timeout')
             error_message = f"Timeout connecting to Winit API for action {action}"
             if has_app_context():
                 current_app.logger.error(error_message)
@@ -102,6 +200,7 @@ class WinitAPI:
                 self.logger.error(error_message)
             raise
         except requests.exceptions.ConnectionError as e:
+            WINIT_ERRORS.inc(action=action, error='connection')
             error_message = f"Connection error to Winit API for action {action}: {e}"
             if has_app_context():
                 current_app.logger.error(error_message)
@@ -109,6 +208,7 @@ class WinitAPI:
                 self.logger.error(error_message)
             raise
         except requests.exceptions.HTTPError as e:
+            WINIT_ERRORS.inc(action=action, error='http')
             error_message = f"HTTP error from Winit API for action {action}: {e}"
             if has_app_context():
                 current_app.logger.error(error_message)
@@ -116,12 +216,15 @@ class WinitAPI:
                 self.logger.error(error_message)
             raise
         except Exception as e:
+            WINIT_ERRORS.inc(action=action, error='other')
             error_message = f"Error making Winit API request for action {action}: {e}"
             if has_app_context():
                 current_app.logger.error(error_message)
             else:
                 self.logger.error(error_message)
             raise
+        finally:
+            WINIT_LATENCY.observe(time.perf_counter() - start, action=action)
 
     def get_product_base_list(self, warehouse_code=None, page_no=1, page_size=50):
         """Get list of products with basic information"""
@@ -149,10 +252,10 @@ class WinitAPI:
         """Get list of available warehouses"""
         return self._make_request('wanyilian.platform.queryWarehouse')
 
-    def get_delivery_methods(self, warehouse_code):
+    def get_delivery_methods(self, warehouse_code, timeout=30):
         """Get available delivery methods for a warehouse"""
         data = {'warehouseCode': warehouse_code}
-        return self._make_request('wanyilian.platform.queryDeliveryWay', data)
+        return self._make_request('wanyilian.platform.queryDeliveryWay', data, timeout=timeout)
 
     def create_outbound_order(self, order_data):
         """Create an outbound order for shipping"""
@@ -241,6 +344,7 @@ class WinitAPI:
         
         # Test HTTP connection
         if results.get('tcp_connection', False):
+            import requests
             try:
                 response = requests.get(
                     f"{parsed_url.scheme}://{hostname}", 
@@ -5,6 +5,7 @@ import logging
 from flask import current_app, has_app_context
 from sqlalchemy.exc import SQLAlchemyError
 
+from app.replica import read_session
 from app.services.winit_api import WinitAPI
 
 logger = logging.getLogger('winit_product_service')
@@ -102,8 +103,8 @@ class WinitProductService:
             else:
                 logger.warning(log_message)
             
-            # Query products from the database
-            query = WinitProduct.query.filter_by(is_active=True)
+            # Query products from the database (replica when available)
+            query = read_session().query(WinitProduct).filter_by(is_active=True)
             
             # Get total count
             total_count = query.count()
@@ -208,7 +209,7 @@ class WinitProductService:
                 logger.warning(log_message)
             
             # Query the product from the database
-            product = WinitProduct.query.filter_by(spu=spu, is_active=True).first()
+            product = read_session().query(WinitProduct).filter_by(spu=spu, is_active=True).first()
             
             if product:
                 # Use the stored additional data if available
@@ -283,4 +284,58 @@ class WinitProductService:
                 'data': {
                     'list': []
                 }
-            } 
\ No newline at end of file
+            } 
+
+    def search_products(self, term, page=1, page_size=20):
+        """
+        Search the imported catalog by name, SPU or SKU
+
+        Served by the read replica when one is configured and caught up.
+
+        Args:
+            term: Text to look for
+            page: Page number for pagination
+            page_size: Number of products per page
+
+        Returns:
+            Dictionary with product list and pagination information, in the
+            Winit API response format
+        """
+        from app.models import WinitProduct
+
+        pattern = f"%{term.strip()}%"
+        try:
+            query = read_session().query(WinitProduct).filter(
+                WinitProduct.is_active.is_(True),
+                WinitProduct.name.ilike(pattern) | WinitProduct.spu.ilike(pattern) | WinitProduct.sku.ilike(pattern))
+            total_count = query.count()
+            products = query.order_by(WinitProduct.name).offset((page - 1) * page_size).limit(page_size).all()
+        except SQLAlchemyError as e:
+            error_message = f"Database error searching products: {e}"
+            if has_app_context():
+                current_app.logger.error(error_message)
+            else:
+                logger.error(error_message)
+            products, total_count = [], 0
+
+        return {
+            'code': '0',
+            'message': 'Search results',
+            'data': {
+                'list': [product.additional_data_dict or {
+                    'SPU': product.spu,
+                    'SKU': product.sku,
+                    'title': product.name,
+                    'price': product.price,
+                    'stock': product.stock,
+                    'images': [{'url': product.image_url}] if product.image_url else [],
+                    'description': product.description,
+                    'category': product.category
+                } for product in products],
+                'pageParams': {
+                    'pageNo': page,
+                    'pageSize': page_size,
+                    'totalCount': total_count
+                }
+            }
+        }
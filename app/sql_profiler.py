@@ -0,0 +1,143 @@
+"""
+Opt-in SQL query profiler with N+1 detection
+
+Counts the queries run during a request (SQL_PROFILER_ENABLED) or a script
+run (``with profile_queries('label'):``), times them and groups them by
+fingerprint: the statement with literals and IN-lists collapsed, so the same
+query with different parameters is counted together. A fingerprint repeated
+at least SQL_PROFILER_N_PLUS_ONE_THRESHOLD times is reported as an N+1
+suspect. A report is logged at the end of every profiled request or run:
+
+    SQL profile [GET /checkout/]: 14 queries in 23.4 ms, 3 distinct
+      N+1 suspect: 12x 18.1 ms  SELECT ... FROM cart_item WHERE cart_item.id = ?
+"""
+import re
+import time
+import logging
+import contextvars
+from contextlib import contextmanager
+from functools import lru_cache
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('sql_profiler')
+
+_active = contextvars.ContextVar('sql_profile', default=None)
+
+_WHITESPACE = re.compile(r'\s+')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN \((?:\s*[?]\s*,)*\s*[?]\s*\)', re.IGNORECASE)
+_VALUES_LIST = re.compile(r'(\([?, ]+\))(?:\s*,\s*\([?, ]+\))+')
+_POSTCOMPILE = re.compile(r'\(?__\[POSTCOMPILE_\w+\]\)?')
+_SELECT_LIST = re.compile(r'^SELECT .+? FROM ', re.IGNORECASE)
+
+@lru_cache(maxsize=1024)
+def fingerprint(statement):
+    """Normalize a SQL statement so calls differing only in parameters match"""
+    sql = _WHITESPACE.sub(' ', statement).strip()
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _POSTCOMPILE.sub('(?...)', sql)
+    sql = _IN_LIST.sub('IN (?...)', sql)
+    sql = _VALUES_LIST.sub(r'\1...', sql)
+    return sql
+
+def _display(sql, limit=300):
+    """Shorten a fingerprint for the report; the column list rarely matters"""
+    sql = _SELECT_LIST.sub('SELECT ... FROM ', sql, count=1)
+    return sql if len(sql) <= limit else sql[:limit] + '...'
+
+class QueryProfile:
+    """Query counts and timings for one request or script run"""
+
+    def __init__(self, label, threshold=10):
+        self.label = label
+        self.threshold = threshold
+        self.queries = 0
+        self.seconds = 0.0
+        # fingerprint -> [count, seconds]
+        self.statements = {}
+
+    def record(self, statement, seconds):
+        self.queries += 1
+        self.seconds += seconds
+        stats = self.statements.setdefault(fingerprint(statement), [0, 0.0])
+        stats[0] += 1
+        stats[1] += seconds
+
+    def suspects(self):
+        """(fingerprint, count, seconds) of statements repeated at least threshold times"""
+        return sorted(((sql, count, seconds) for sql, (count, seconds) in self.statements.items()
+                       if count >= self.threshold), key=lambda s: -s[1])
+
+    def report(self, top=5):
+        lines = [f"SQL profile [{self.label}]: {self.queries} queries in "
+                 f"{self.seconds * 1000:.1f} ms, {len(self.statements)} distinct"]
+        suspects = self.suspects()
+        for sql, count, seconds in suspects:
+            lines.append(f"  N+1 suspect: {count}x {seconds * 1000:.1f} ms  {_display(sql)}")
+        flagged = {sql for sql, _, _ in suspects}
+        slowest = sorted(self.statements.items(), key=lambda s: -s[1][1])
+        for sql, (count, seconds) in [s for s in slowest if s[0] not in flagged][:top]:
+            lines.append(f"  {count}x {seconds * 1000:.1f} ms  {_display(sql)}")
+        return '\n'.join(lines)
+
+    def log(self, log=None):
+        (log or logger).log(logging.WARNING if self.suspects() else logging.INFO, self.report())
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _active.get() is not None:
+        conn.info.setdefault('sql_profile_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _active.get()
+    starts = conn.info.get('sql_profile_start')
+    if profile is not None and starts:
+        profile.record(statement, time.perf_counter() - starts.pop())
+
+def _install():
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+@contextmanager
+def profile_queries(label, threshold=10, log=None):
+    """
+    Profile the queries run inside the block and log a report at the end
+
+    Args:
+        label: Name shown in the report (e.g. the script or job name)
+        threshold: Repeats of one fingerprint that count as an N+1 suspect
+        log: Logger for the report (default: the sql_profiler logger)
+    """
+    _install()
+    profile = QueryProfile(label, threshold)
+    token = _active.set(profile)
+    try:
+        yield profile
+    finally:
+        _active.reset(token)
+        profile.log(log)
+
+def init_app(app):
+    """Profile every request if SQL_PROFILER_ENABLED is set"""
+    if not app.config.get('SQL_PROFILER_ENABLED'):
+        return
+    _install()
+    threshold = app.config.get('SQL_PROFILER_N_PLUS_ONE_THRESHOLD', 10)
+
+    @app.before_request
+    def start_sql_profile():
+        g.sql_profile_token = _active.set(QueryProfile(f"{request.method} {request.path}", threshold))
+
+    @app.teardown_request
+    def finish_sql_profile(exc):
+        token = g.pop('sql_profile_token', None)
+        if token is None:
+            return
+        profile = _active.get()
+        _active.reset(token)
+        profile.log(app.logger)
@@ -0,0 +1,111 @@
+"""
+Warm-up in the uWSGI master before the workers are forked
+
+uWSGI loads wsgi.py once in the master and forks the workers from it (no
+lazy-apps in locoganga.ini), so whatever the master loads is shared with
+every worker copy-on-write. prepare_uwsgi() uses that to parse the fallback
+catalog, compile every template, import the Stripe and HTTP clients and prime
+the delivery-method cache before the first visitor arrives. After the fork,
+each worker gets its own database pool and HTTP sessions so no socket opened
+by the master is ever shared.
+"""
+import time
+import logging
+
+from app import db
+from app.services.product_service import ProductService
+from app.services.winit_api import get_cached_delivery_methods, http_session, reset_http_session
+
+logger = logging.getLogger('warmup')
+
+def warm_up(app):
+    """
+    Load what every worker needs into this process
+
+    Each step is best effort: a Winit outage must not stop the workers from
+    starting, they fill the caches on first use instead.
+
+    Returns:
+        dict: Seconds spent per step and what was loaded
+    """
+    stats = {}
+    with app.app_context():
+        start = time.perf_counter()
+        stats['fallback_products'] = len(ProductService.load_fallback_products())
+        stats['fallback_seconds'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        templates = app.jinja_env.list_templates(filter_func=lambda name: name.endswith(('.html', '.txt')))
+        for name in templates:
+            try:
+                app.jinja_env.get_template(name)
+            except Exception as e:
+                logger.warning(f"Could not compile template {name}: {e}")
+        stats['templates'] = len(templates)
+        stats['template_seconds'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        import stripe  # noqa: F401 - imported once here instead of in every worker
+        http_session()
+        stats['client_seconds'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        try:
+            stats['delivery_methods'] = len(get_cached_delivery_methods(app, app.config['WINIT_WAREHOUSE_CODE'], timeout=5))
+        except Exception as e:
+            logger.warning(f"Could not prime delivery methods: {e}")
+            stats['delivery_methods'] = 0
+        stats['delivery_seconds'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        try:
+            # Load the dialect and check the database is there, then close
+            # the connection so no worker inherits it
+            with db.engine.connect() as connection:
+                connection.exec_driver_sql('SELECT 1')
+        except Exception as e:
+            logger.warning(f"Could not reach the database: {e}")
+        for bind in [None] + list(app.config.get('SQLALCHEMY_BINDS') or {}):
+            db.get_engine(app, bind=bind).dispose()
+        stats['database_seconds'] = time.perf_counter() - start
+
+    reset_http_session()
+    return stats
+
+def reset_after_fork(app):
+    """Give a freshly forked worker its own database pool and HTTP sessions"""
+    import stripe
+
+    with app.app_context():
+        # close=False: the connections belong to the master, only forget them
+        for bind in [None] + list(app.config.get('SQLALCHEMY_BINDS') or {}):
+            db.get_engine(app, bind=bind).dispose(close=False)
+        try:
+            with db.engine.connect():
+                pass
+        except Exception as e:
+            logger.warning(f"Worker could not open a database connection: {e}")
+    reset_http_session()
+    stripe.default_http_client = None
+
+def prepare_uwsgi(app):
+    """
+    Warm up before fork and register the post-fork reset, under uWSGI only
+
+    Does nothing elsewhere, so `flask db` and the scripts that load wsgi.py
+    do not call Winit or compile templates.
+    """
+    try:
+        from uwsgidecorators import postfork
+    except ImportError:
+        return False
+
+    if app.config.get('WARMUP_ENABLED', True):
+        start = time.perf_counter()
+        stats = warm_up(app)
+        app.logger.info(f"Warm-up before fork in {(time.perf_counter() - start) * 1000:.0f} ms: "
+                        f"{stats['fallback_products']} fallback products, {stats['templates']} templates, "
+                        f"{stats['delivery_methods']} delivery methods")
+
+    postfork(lambda: reset_after_fork(app))
+    return True
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+Script to benchmark order confirmation email rendering by order size
+
+Times EmailService.render_order_confirmation (both HTML and plain-text
+variants) for a range of item counts and reports the median render time
+and the cost per item.
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+from dotenv import load_dotenv
+
+# Add the current directory to the path so we can import the app
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+# Load environment variables
+load_dotenv()
+
+def make_order(item_count):
+    """Build order data shaped like an outbox payload"""
+    return {
+        'email': 'customer@example.com',
+        'items': [{
+            'sku': f'SKU{i:05d}',
+            'title': f'Benchmark product {i} with a reasonably long title',
+            'price': 9.99 + i,
+            'quantity': 1 + i % 3,
+            'thumbnail': f'https://example.com/images/{i}.jpg'
+        } for i in range(item_count)],
+        'total': sum((9.99 + i) * (1 + i % 3) for i in range(item_count)),
+        'shipping_details': {
+            'name': 'Benchmark Customer',
+            'address': {
+                'line1': '1 Test Street',
+                'line2': 'Flat 2',
+                'city': 'London',
+                'state': '',
+                'postal_code': 'E1 6AN',
+                'country': 'GB'
+            }
+        },
+        'order_number': 'STRIPE_cs_test_benchmark',
+        'order_date': 'January 01, 2026'
+    }
+
+def time_call(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark order confirmation email rendering')
+    parser.add_argument('--sizes', default='1,10,50,200,1000', help='Comma-separated item counts')
+    parser.add_argument('--repeat', type=int, default=50, help='Renders per measurement')
+    args = parser.parse_args()
+
+    from app import create_app
+    from app.services.email_service import EmailService
+
+    app = create_app()
+    email_service = EmailService.from_app(app)
+
+    with app.app_context():
+        # Warm up template compilation so it is not counted in the first size
+        email_service.render_order_confirmation(make_order(1))
+
+        print(f"{'items':>6} {'render ms':>10} {'us/item':>8}")
+        for size in [int(s) for s in args.sizes.split(',')]:
+            order = make_order(size)
+            render_ms = time_call(lambda: email_service.render_order_confirmation(order), args.repeat)
+            print(f"{size:>6} {render_ms:>10.3f} {render_ms * 1000 / size:>8.1f}")
+
+if __name__ == '__main__':
+    main()
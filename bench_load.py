@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+"""
+Script to load-test the storefront against local Winit and Stripe stand-ins
+
+Starts fake_winit_server.py and fake_stripe_server.py in-process, serves the
+app on a local port (with a throwaway SQLite database unless --database-url
+is given) and runs concurrent virtual users through scripted scenarios:
+
+    browse    GET / on a random catalog page
+    cart      POST /cart/add, GET /cart/summary
+    checkout  POST /cart/add, GET /checkout/, POST /checkout/create-checkout-session
+    webhook   POST /checkout/webhook with a signed checkout.session.completed event
+
+Latency percentiles (p50/p95/p99) and requests/sec are reported per route and
+saved as JSON for comparison with a later run:
+
+    python bench_load.py --users 8 --duration 30 --save bench_results/baseline.json
+    python bench_load.py --users 8 --duration 30 --baseline bench_results/baseline.json
+
+--url runs the scenarios against a server that is already running instead;
+start it with WINIT_API_URL, STRIPE_API_BASE and STRIPE_WEBHOOK_SECRET
+pointing at the stand-ins (the values this script prints). The in-process
+server shares the GIL with the load generator, so its numbers are for
+comparing runs with each other, not for capacity planning.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import logging
+import argparse
+import tempfile
+import threading
+from datetime import datetime
+import requests
+from dotenv import load_dotenv
+
+# Add the current directory to the path so we can import the app
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+# Load environment variables
+load_dotenv()
+
+from fake_winit_server import FakeWinitServer
+from fake_stripe_server import FakeStripeServer
+from send_test_webhook import DEFAULT_SECRET, make_event, sign_payload
+
+# Only warnings (the stand-ins configured logging at INFO on import): the
+# Stripe client and werkzeug alone log three lines per request at INFO
+logging.getLogger().setLevel(logging.WARNING)
+logging.getLogger('werkzeug').setLevel(logging.WARNING)
+logger = logging.getLogger('bench_load')
+
+SCENARIOS = ('browse', 'cart', 'checkout', 'webhook')
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_results')
+
+class Recorder:
+    """Latencies and error counts per route, shared by the virtual users"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, route, seconds, ok):
+        with self._lock:
+            self.latencies.setdefault(route, []).append(seconds)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an ascending list"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))]
+
+def summarize(latencies, errors, elapsed):
+    ordered = sorted(latencies)
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'rps': round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(ordered, 50) * 1000, 2),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 2),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 2),
+        'max_ms': round(ordered[-1] * 1000, 2) if ordered else 0.0
+    }
+
+class VirtualUser:
+    """One shopper with its own cookies (and so its own cart)"""
+
+    def __init__(self, base_url, products, recorder, webhook_secret):
+        self.base_url = base_url
+        self.products = products
+        self.recorder = recorder
+        self.webhook_secret = webhook_secret
+        self.http = requests.Session()
+
+    def request(self, method, route, path=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.http.request(method, self.base_url + (path or route), allow_redirects=False,
+                                         timeout=30, **kwargs)
+            ok = response.status_code < 400
+        except requests.RequestException as e:
+            logger.debug(f"{method} {route} failed: {e}")
+            response, ok = None, False
+        self.recorder.record(f"{method} {route}", time.perf_counter() - start, ok)
+        return response
+
+    def add_random_product(self):
+        product = random.choice(self.products)
+        sku = product['SKUList'][0]
+        self.request('POST', '/cart/add', json={
+            'sku': sku['SKU'],
+            'spu': product['SPU'],
+            'title': product['title'],
+            'price': sku['supplyPrice'],
+            'thumbnail': product.get('thumbnail')
+        })
+
+    def browse(self):
+        pages = max((len(self.products) + 19) // 20, 1)
+        self.request('GET', '/', f"/?page={random.randint(1, pages)}")
+
+    def cart(self):
+        self.add_random_product()
+        self.request('GET', '/cart/summary')
+
+    def checkout(self):
+        self.add_random_product()
+        self.request('GET', '/checkout/')
+        self.request('POST', '/checkout/create-checkout-session')
+
+    def webhook(self):
+        event = make_event('checkout.session.completed', f"cs_bench_{uuid.uuid4().hex}",
+                           uuid.uuid4().hex, 'bench@example.com')
+        payload = json.dumps(event)
+        self.request('POST', '/checkout/webhook', data=payload, headers={
+            'Content-Type': 'application/json',
+            'Stripe-Signature': sign_payload(payload, self.webhook_secret)
+        })
+
+def run_users(base_url, products, scenarios, users, duration, webhook_secret):
+    """Run the scenarios round-robin in every user until duration runs out"""
+    recorder = Recorder()
+    deadline = time.monotonic() + duration
+
+    def user_loop(index):
+        user = VirtualUser(base_url, products, recorder, webhook_secret)
+        turn = index
+        while time.monotonic() < deadline:
+            getattr(user, scenarios[turn % len(scenarios)])()
+            turn += 1
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=user_loop, args=(i,), daemon=True) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder, time.monotonic() - started
+
+def start_app(winit_url, stripe_url, database_url):
+    """Serve the app in a background thread and return its base URL"""
+    os.environ.update({
+        'WINIT_API_URL': winit_url,
+        'WINIT_APP_KEY': os.environ.get('WINIT_APP_KEY') or 'bench',
+        'WINIT_TOKEN': os.environ.get('WINIT_TOKEN') or 'bench',
+        'STRIPE_API_BASE': stripe_url,
+        'STRIPE_SECRET_KEY': 'sk_test_bench',
+        'STRIPE_PUBLISHABLE_KEY': 'pk_test_bench',
+        'STRIPE_WEBHOOK_SECRET': DEFAULT_SECRET,
+        'DATABASE_URL': database_url
+    })
+    from werkzeug.serving import make_server
+    from app import create_app, db
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+    # Per-request INFO logging would dominate the profile of a load test
+    app.logger.setLevel(logging.WARNING)
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    app.config['SERVER_NAME'] = f"127.0.0.1:{server.server_port}"
+    app.config['PREFERRED_URL_SCHEME'] = 'http'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+def compare(results, baseline, tolerance):
+    """Print the change against a baseline run; returns the regressed routes"""
+    regressions = []
+    print(f"\n{'route':<40} {'p95 base':>9} {'p95 now':>9} {'change':>8} {'rps base':>9} {'rps now':>9} {'change':>8}")
+    for route, now in results['routes'].items():
+        base = baseline['routes'].get(route)
+        if not base:
+            continue
+        p95_change = (now['p95_ms'] - base['p95_ms']) / base['p95_ms'] if base['p95_ms'] else 0.0
+        rps_change = (now['rps'] - base['rps']) / base['rps'] if base['rps'] else 0.0
+        flag = ''
+        if p95_change > tolerance or rps_change < -tolerance:
+            regressions.append(route)
+            flag = '  REGRESSION'
+        print(f"{route:<40} {base['p95_ms']:>9.1f} {now['p95_ms']:>9.1f} {p95_change:>+8.0%} "
+              f"{base['rps']:>9.1f} {now['rps']:>9.1f} {rps_change:>+8.0%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test the storefront against local Winit and Stripe stand-ins')
+    parser.add_argument('--url', default=None, help='Test a running server instead of an in-process one')
+    parser.add_argument('--users', type=int, default=4, help='Concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds to run')
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS, default=None,
+                        help='Scenario to run (repeatable, default: all)')
+    parser.add_argument('--winit-latency', type=float, default=0.05, help='Seconds the Winit stand-in waits per call')
+    parser.add_argument('--winit-fail-rate', type=float, default=0.0, help='Fraction of Winit calls to fail')
+    parser.add_argument('--stripe-latency', type=float, default=0.1, help='Seconds the Stripe stand-in waits per call')
+    parser.add_argument('--stripe-fail-rate', type=float, default=0.0, help='Fraction of Stripe calls to fail')
+    parser.add_argument('--recordings', default=None, help='Directory of recorded Winit <action>.json responses')
+    parser.add_argument('--database-url', default=None, help='Database for the in-process app (default: temporary SQLite)')
+    parser.add_argument('--save', default=None, help='Results file (default: bench_results/load-<timestamp>.json)')
+    parser.add_argument('--baseline', default=None, help='Earlier results file to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p95/rps change before a route regresses')
+    args = parser.parse_args()
+    scenarios = args.scenario or list(SCENARIOS)
+
+    winit = FakeWinitServer('127.0.0.1', 0, latency=args.winit_latency, fail_rate=args.winit_fail_rate,
+                            recordings=args.recordings).start()
+    stripe_server = FakeStripeServer('127.0.0.1', 0, latency=args.stripe_latency,
+                                     fail_rate=args.stripe_fail_rate).start()
+
+    if args.url:
+        base_url = args.url.rstrip('/')
+        print(f"Run the server with WINIT_API_URL={winit.url} STRIPE_API_BASE={stripe_server.url} "
+              f"STRIPE_WEBHOOK_SECRET={DEFAULT_SECRET}")
+    else:
+        database_url = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+        base_url = start_app(winit.url, stripe_server.url, database_url)
+
+    print(f"Running {', '.join(scenarios)} with {args.users} users for {args.duration:.0f}s against {base_url}")
+    recorder, elapsed = run_users(base_url, winit.products, scenarios, args.users, args.duration, DEFAULT_SECRET)
+
+    results = {
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'target': 'in-process' if not args.url else base_url,
+        'users': args.users,
+        'duration': round(elapsed, 2),
+        'scenarios': scenarios,
+        'winit_latency': args.winit_latency,
+        'stripe_latency': args.stripe_latency,
+        'routes': {
+            route: summarize(latencies, recorder.errors.get(route, 0), elapsed)
+            for route, latencies in sorted(recorder.latencies.items())
+        },
+        'total': summarize([s for latencies in recorder.latencies.values() for s in latencies],
+                           sum(recorder.errors.values()), elapsed)
+    }
+
+    print(f"\n{'route':<40} {'requests':>8} {'errors':>6} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for route, stats in list(results['routes'].items()) + [('total', results['total'])]:
+        print(f"{route:<40} {stats['requests']:>8} {stats['errors']:>6} {stats['rps']:>8.1f} "
+              f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}")
+
+    path = args.save or os.path.join(RESULTS_DIR, f"load-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} route(s) regressed beyond {args.tolerance:.0%}")
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
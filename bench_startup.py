@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+Script to benchmark app cold start against a budget
+
+Starts fresh interpreters that import the app and call create_app() the way
+a uWSGI worker does (a stand-in `uwsgi` module is installed so the worker
+code path is taken), with -X importtime on. Reports the median time to
+import the app package, to run create_app() and for the whole process, the
+packages that cost the most import time, and fails when the median
+create-to-ready time exceeds --budget-ms.
+
+    python bench_startup.py
+    python bench_startup.py --runs 10 --budget-ms 400 --top 20
+    python bench_startup.py --cli   # as `flask db` and the scripts see it
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.abspath(os.path.dirname(__file__))
+
+CHILD = r'''
+import sys, time, json, types
+started = time.perf_counter()
+if {uwsgi}:
+    sys.modules['uwsgi'] = types.ModuleType('uwsgi')
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+print(json.dumps({{'import_ms': (imported - started) * 1000, 'create_ms': (created - imported) * 1000}}))
+'''
+
+def parse_importtime(stderr):
+    """Self import time in microseconds per top-level package"""
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        totals[package] = totals.get(package, 0) + int(self_us)
+    return totals
+
+def run_once(uwsgi):
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', 'sqlite://')
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD.format(uwsgi=uwsgi)],
+                            cwd=ROOT, env=env, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        sys.exit(f"Startup failed:\n{result.stderr[-2000:]}")
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings['process_ms'] = wall_ms
+    return timings, parse_importtime(result.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark app cold start against a budget')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters to start')
+    parser.add_argument('--budget-ms', type=float, default=500, help='Allowed median import + create_app time')
+    parser.add_argument('--top', type=int, default=15, help='Packages to list by import time')
+    parser.add_argument('--cli', action='store_true', help='Start as outside uWSGI (Flask-Migrate initialized)')
+    args = parser.parse_args()
+
+    runs, packages = [], {}
+    for _ in range(args.runs):
+        timings, totals = run_once(uwsgi=not args.cli)
+        runs.append(timings)
+        for package, us in totals.items():
+            packages.setdefault(package, []).append(us)
+
+    medians = {key: statistics.median(r[key] for r in runs) for key in ('import_ms', 'create_ms', 'process_ms')}
+    ready_ms = medians['import_ms'] + medians['create_ms']
+
+    print(f"Median of {args.runs} cold starts ({'CLI' if args.cli else 'uWSGI worker'} path):")
+    print(f"  import app    {medians['import_ms']:8.1f} ms")
+    print(f"  create_app()  {medians['create_ms']:8.1f} ms")
+    print(f"  process       {medians['process_ms']:8.1f} ms (interpreter start and exit included)")
+
+    print(f"\n{'package':<28} {'import ms':>10}")
+    ranked = sorted(packages.items(), key=lambda p: -statistics.median(p[1]))
+    for package, samples in ranked[:args.top]:
+        print(f"{package:<28} {statistics.median(samples) / 1000:>10.1f}")
+
+    verdict = 'within' if ready_ms <= args.budget_ms else 'OVER'
+    print(f"\nimport + create_app {ready_ms:.1f} ms, {verdict} the {args.budget_ms:.0f} ms budget")
+    return 0 if ready_ms <= args.budget_ms else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
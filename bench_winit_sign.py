@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""
+Script to benchmark Winit request signing and body construction by payload size
+
+Compares the previous request path, where _generate_sign serialized the data
+payload for the signature and requests serialized the whole params dict again
+for the body, with WinitAPI._prepare_request, which serializes the data once
+and reuses it for both. Payloads are outbound orders with a range of product
+line counts, plus a product-list query. Each size is checked to produce the
+same signature and the same JSON on both paths before it is timed.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+from datetime import datetime
+
+# Add the current directory to the path so we can import the app
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+def make_order(line_count):
+    """Outbound order payload shaped like FulfillmentService.build_outbound_order"""
+    return {
+        'warehouseCode': 'UKGF',
+        'sellerOrderNo': 'LGBENCHMARK01',
+        'recipientName': 'Benchmark Customer',
+        'phoneNum': '+44 20 7946 0000',
+        'emailAddress': 'customer@example.com',
+        'address1': '1 Test Street',
+        'address2': 'Flat 2',
+        'city': 'London',
+        'state': '',
+        'zipCode': 'E1 6AN',
+        'country': 'GB',
+        'productList': [{
+            'productCode': f'w{13400000 + i}',
+            'specification': f'S{10120000 + i}',
+            'productNum': 1 + i % 3
+        } for i in range(line_count)]
+    }
+
+def legacy_request(api, action, data):
+    """The request path before _prepare_request: data is encoded twice"""
+    params = {
+        'action': action,
+        'app_key': api.app_key,
+        'data': data,
+        'format': 'json',
+        'language': 'zh_CN',
+        'platform': api.platform,
+        'sign_method': 'md5',
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'version': '1.0'
+    }
+    params['sign'] = api._generate_sign(params)
+    # What requests.post(json=params) sent
+    return json.dumps(params, allow_nan=False).encode('utf-8')
+
+def time_call(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Winit request signing and body construction')
+    parser.add_argument('--sizes', default='1,10,100,1000,5000', help='Comma-separated order line counts')
+    parser.add_argument('--repeat', type=int, default=200, help='Calls per measurement')
+    args = parser.parse_args()
+
+    from app.services.winit_api import WinitAPI
+
+    api = WinitAPI('http://localhost/cedpopenapi/service', 'bench-app-key', 'bench-token')
+    action = 'wanyilian.distributor.order.create'
+
+    cases = [('query', {'pageParams': {'pageNo': 1, 'pageSize': 50, 'totalCount': 0}, 'warehouseCode': 'UKGF'})]
+    cases += [(f'{size} lines', make_order(size)) for size in [int(s) for s in args.sizes.split(',')]]
+
+    print(f"{'payload':>12} {'bytes':>9} {'legacy us':>10} {'single us':>10} {'speedup':>8}")
+    for name, data in cases:
+        legacy = json.loads(legacy_request(api, action, data))
+        body = api._prepare_request(action, data)
+        single = json.loads(body)
+        # Timestamps only differ if the clock ticked over between the two calls
+        if legacy['timestamp'] == single['timestamp']:
+            assert legacy == single, f"{name}: bodies differ"
+
+        legacy_us = time_call(lambda: legacy_request(api, action, data), args.repeat)
+        single_us = time_call(lambda: api._prepare_request(action, data), args.repeat)
+        print(f"{name:>12} {len(body):>9} {legacy_us:>10.1f} {single_us:>10.1f} {legacy_us / single_us:>7.2f}x")
+
+if __name__ == '__main__':
+    main()
@@ -19,21 +19,83 @@ class Config(object):
     CSRF_ENABLED = True
     SERVER_NAME = os.environ.get('SERVER_NAME') or 'locoganga.com'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
+    # Connection pool (app/db_pool.py): the budget is shared by the uWSGI workers and worker.py jobs
+    DB_MAX_CONNECTIONS = int(os.environ.get('DB_MAX_CONNECTIONS', 30))
+    DB_POOL_SIZE = int(os.environ['DB_POOL_SIZE']) if os.environ.get('DB_POOL_SIZE') else None  # default: derived
+    DB_MAX_OVERFLOW = int(os.environ['DB_MAX_OVERFLOW']) if os.environ.get('DB_MAX_OVERFLOW') else None
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 10))  # seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 280))  # below MySQL's idle wait_timeout
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    # worker.py processes: a fixed pool each, reserved out of DB_MAX_CONNECTIONS
+    DB_BACKGROUND_POOL_SIZE = int(os.environ.get('DB_BACKGROUND_POOL_SIZE', 2))
+    DB_POOL_BACKGROUND = os.environ.get('DB_POOL_BACKGROUND', 'false').lower() == 'true'  # set by worker.py
+    # Read replica (app/replica.py) for catalog and reporting reads; unset: everything on the primary
+    REPLICA_DATABASE_URL = os.environ.get('REPLICA_DATABASE_URL')
+    SQLALCHEMY_BINDS = {'replica': REPLICA_DATABASE_URL} if REPLICA_DATABASE_URL else None
+    REPLICA_MAX_LAG_SECONDS = int(os.environ.get('REPLICA_MAX_LAG_SECONDS', 30))  # staler: read the primary
+    REPLICA_LAG_CHECK_SECONDS = int(os.environ.get('REPLICA_LAG_CHECK_SECONDS', 5))
     MAX_CONTENT_LENGTH = 64 * 1024 * 1024
     ROOT_DIRECTORY = os.path.dirname(__file__)
 
     LOG_DIR = os.path.join(ROOT_DIRECTORY, 'logs')
+    # Server-Timing headers and per-request timing records in the log
+    REQUEST_TIMING_ENABLED = os.environ.get('REQUEST_TIMING_ENABLED', 'false').lower() == 'true'
+    # Each worker snapshots its metrics here so /metrics can sum them
+    METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(ROOT_DIRECTORY, 'metrics'))
+    METRICS_FLUSH_SECONDS = int(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+    # Bearer token required by /metrics; without one it is only served in debug mode
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # Per-request SQL query report in the log, flagging repeated statements
+    SQL_PROFILER_ENABLED = os.environ.get('SQL_PROFILER_ENABLED', 'false').lower() == 'true'
+    SQL_PROFILER_N_PLUS_ONE_THRESHOLD = int(os.environ.get('SQL_PROFILER_N_PLUS_ONE_THRESHOLD', 10))
+    # Load caches and templates in the uWSGI master before fork (app/warmup.py)
+    WARMUP_ENABLED = os.environ.get('WARMUP_ENABLED', 'true').lower() == 'true'
+    # Stack sampling profiler writing collapsed stacks to LOG_DIR/profiles, for a
+    # fraction of PROFILER_ENDPOINTS requests or requests with a make_profile_token.py token
+    PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', 'false').lower() == 'true'
+    PROFILER_SAMPLE_RATE = float(os.environ.get('PROFILER_SAMPLE_RATE', 0.0))
+    PROFILER_ENDPOINTS = os.environ.get('PROFILER_ENDPOINTS', 'main.index,checkout.*')
+    PROFILER_INTERVAL_MS = int(os.environ.get('PROFILER_INTERVAL_MS', 5))
+    PROFILER_TOKEN_MAX_AGE = int(os.environ.get('PROFILER_TOKEN_MAX_AGE', 3600))  # seconds
 
     # Stripe configuration
     STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY')
     STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY')
     STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET')
+    STRIPE_API_BASE = os.environ.get('STRIPE_API_BASE')  # e.g. fake_stripe_server.py for load tests
     DOMAIN_URL = os.environ.get('SERVER_NAME', 'http://localhost:5000')
+    # Checkout session creation retries happen while the customer waits
+    STRIPE_RETRY_MAX_ATTEMPTS = int(os.environ.get('STRIPE_RETRY_MAX_ATTEMPTS', 3))
+    STRIPE_RETRY_BASE_DELAY = float(os.environ.get('STRIPE_RETRY_BASE_DELAY', 0.25))
+    STRIPE_RETRY_MAX_DELAY = float(os.environ.get('STRIPE_RETRY_MAX_DELAY', 1.0))
+    STRIPE_RETRY_DEADLINE_SECONDS = float(os.environ.get('STRIPE_RETRY_DEADLINE_SECONDS', 3.0))
+    STRIPE_WEBHOOK_MAX_ATTEMPTS = int(os.environ.get('STRIPE_WEBHOOK_MAX_ATTEMPTS', 10))
+    ORDER_FINALIZATION_MAX_ATTEMPTS = int(os.environ.get('ORDER_FINALIZATION_MAX_ATTEMPTS', 10))
 
     # Winit API configuration
     WINIT_API_URL = os.environ.get('WINIT_API_URL', 'https://openapi.wanyilian.com/cedpopenapi/service')
     WINIT_APP_KEY = os.environ.get('WINIT_APP_KEY')
     WINIT_TOKEN = os.environ.get('WINIT_TOKEN')
+    WINIT_WAREHOUSE_CODE = os.environ.get('WINIT_WAREHOUSE_CODE', 'UKGF')
+    WINIT_DELIVERY_WAY_ID = os.environ.get('WINIT_DELIVERY_WAY_ID')
+    WINIT_DELIVERY_METHODS_CACHE_SECONDS = int(os.environ.get('WINIT_DELIVERY_METHODS_CACHE_SECONDS', 900))
+
+    # Winit outbound fulfillment (worker.py fulfill-orders)
+    WINIT_FULFILLMENT_BATCH_SIZE = int(os.environ.get('WINIT_FULFILLMENT_BATCH_SIZE', 50))
+    WINIT_FULFILLMENT_CONCURRENCY = int(os.environ.get('WINIT_FULFILLMENT_CONCURRENCY', 4))  # parallel create calls
+    WINIT_FULFILLMENT_MAX_ATTEMPTS = int(os.environ.get('WINIT_FULFILLMENT_MAX_ATTEMPTS', 8))
+    # Off by default: the job creates real outbound orders in Winit
+    WINIT_FULFILLMENT_ENABLED = os.environ.get('WINIT_FULFILLMENT_ENABLED', 'false').lower() == 'true'
+
+    # worker.py jobs that stay idle unless the named setting is on
+    WORKER_JOB_SWITCHES = {
+        'fulfill-orders': 'WINIT_FULFILLMENT_ENABLED',
+        'replica-heartbeat': 'REPLICA_DATABASE_URL',
+    }
+
+    # Winit status/tracking sync (worker.py sync-tracking)
+    WINIT_TRACKING_PAGE_SIZE = int(os.environ.get('WINIT_TRACKING_PAGE_SIZE', 500))
+    WINIT_TRACKING_LOOKBACK_DAYS = int(os.environ.get('WINIT_TRACKING_LOOKBACK_DAYS', 30))  # first sync only
 
     # Mail configuration
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
@@ -42,6 +104,21 @@ class Config(object):
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER')
+    MAIL_TIMEOUT = int(os.environ.get('MAIL_TIMEOUT', 30))  # SMTP socket timeout in seconds
+    MAIL_CONNECTION_IDLE_CHECK_SECONDS = int(os.environ.get('MAIL_CONNECTION_IDLE_CHECK_SECONDS', 30))  # NOOP probe after this idle time
+
+    # Email outbox (drained by worker.py send-emails)
+    MAIL_OUTBOX_BATCH_SIZE = int(os.environ.get('MAIL_OUTBOX_BATCH_SIZE', 20))
+    MAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('MAIL_OUTBOX_MAX_ATTEMPTS', 8))
+    MAIL_OUTBOX_RETRY_BASE_SECONDS = int(os.environ.get('MAIL_OUTBOX_RETRY_BASE_SECONDS', 30))
+    MAIL_OUTBOX_RETRY_MAX_SECONDS = int(os.environ.get('MAIL_OUTBOX_RETRY_MAX_SECONDS', 3600))
+
+    # Cart storage: 'sql' keeps carts in the cart_item table, 'local' keeps them
+    # in a host-local SQLite file shared by the uWSGI workers until checkout
+    CART_BACKEND = os.environ.get('CART_BACKEND', 'sql')
+    CART_STORE_PATH = os.environ.get('CART_STORE_PATH', os.path.join(ROOT_DIRECTORY, 'carts.db'))
+    CART_TTL_SECONDS = int(os.environ.get('CART_TTL_SECONDS', 7 * 24 * 3600))  # Abandoned cart lifetime
+    CART_COMPACTION_BATCH_SIZE = int(os.environ.get('CART_COMPACTION_BATCH_SIZE', 500))
 
     # Product settings
     PRODUCT_PAGE_SIZE = int(os.environ.get('PRODUCT_PAGE_SIZE', 20))  # Products per page
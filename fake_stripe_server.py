@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+"""
+Script to run a local HTTP stand-in for the Stripe API
+
+Implements the Checkout Session calls the app makes (create and retrieve),
+keeping sessions in memory. API keys are not checked and every session is
+reported as paid, as if the customer had completed the payment page. Point
+the app at it with:
+
+    STRIPE_API_BASE=http://localhost:8766 STRIPE_SECRET_KEY=sk_test_local
+
+Requests repeating an Idempotency-Key get the session created by the first
+one, as with Stripe. --latency adds a delay to every call and --fail-rate
+answers a fraction of them with a 500 to exercise the checkout retries.
+"""
+import sys
+import json
+import time
+import uuid
+import random
+import logging
+import argparse
+import threading
+from urllib.parse import parse_qsl
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('fake_stripe_server')
+
+SESSIONS_PATH = '/v1/checkout/sessions'
+
+class StripeHandler(BaseHTTPRequestHandler):
+    """Answers Checkout Session requests with Stripe-shaped JSON"""
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        params = dict(parse_qsl(self.rfile.read(length).decode('utf-8'), keep_blank_values=True))
+        if not self.server.begin('POST', self.path):
+            return self.respond(500, api_error('api_error', 'Temporary failure (injected)'))
+        if self.path.rstrip('/') != SESSIONS_PATH:
+            return self.respond(404, api_error('invalid_request_error', f'Unrecognized request URL (POST: {self.path})'))
+        self.respond(200, self.server.create_session(params, self.headers.get('Idempotency-Key')))
+
+    def do_GET(self):
+        if not self.server.begin('GET', self.path):
+            return self.respond(500, api_error('api_error', 'Temporary failure (injected)'))
+        session = None
+        if self.path.startswith(SESSIONS_PATH + '/'):
+            session = self.server.sessions.get(self.path[len(SESSIONS_PATH) + 1:].split('?')[0])
+        if session is None:
+            return self.respond(404, api_error('invalid_request_error', 'No such checkout.session'))
+        self.respond(200, session)
+
+    def respond(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('Request-Id', f"req_local_{uuid.uuid4().hex[:14]}")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+def api_error(error_type, message):
+    return {'error': {'type': error_type, 'message': message}}
+
+class FakeStripeServer(ThreadingHTTPServer):
+    """Stripe stand-in that can also be started in a background thread from tests"""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host='localhost', port=8766, latency=0.0, fail_rate=0.0):
+        super().__init__((host, port), StripeHandler)
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.sessions = {}
+        self.calls = []
+        self._idempotent = {}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def begin(self, method, path):
+        """Record a call and apply the latency; False when it should fail"""
+        with self._lock:
+            self.calls.append((method, path))
+        if self.latency:
+            time.sleep(self.latency)
+        return random.random() >= self.fail_rate
+
+    def create_session(self, params, idempotency_key=None):
+        with self._lock:
+            if idempotency_key and idempotency_key in self._idempotent:
+                return self.sessions[self._idempotent[idempotency_key]]
+            session_id = f"cs_test_{uuid.uuid4().hex}"
+            metadata = {key[len('metadata['):-1]: value for key, value in params.items()
+                        if key.startswith('metadata[')}
+            amount_total, line = 0, 0
+            while f"line_items[{line}][quantity]" in params:
+                amount_total += (int(params.get(f"line_items[{line}][price_data][unit_amount]", 0))
+                                 * int(params[f"line_items[{line}][quantity]"]))
+                line += 1
+            self.sessions[session_id] = {
+                'id': session_id,
+                'object': 'checkout.session',
+                'mode': params.get('mode', 'payment'),
+                'currency': params.get('line_items[0][price_data][currency]', 'usd'),
+                'amount_total': amount_total,
+                'payment_status': 'paid',
+                'status': 'complete',
+                'url': f"{self.url}/pay/{session_id}",
+                'success_url': params.get('success_url'),
+                'cancel_url': params.get('cancel_url'),
+                'metadata': metadata,
+                'customer_details': {'email': 'customer@example.com', 'phone': None},
+                'shipping_details': {
+                    'name': 'Local Test',
+                    'address': {
+                        'line1': '1 Test Street',
+                        'line2': None,
+                        'city': 'London',
+                        'state': None,
+                        'postal_code': 'E1 6AN',
+                        'country': 'GB'
+                    }
+                },
+                'created': int(time.time())
+            }
+            if idempotency_key:
+                self._idempotent[idempotency_key] = session_id
+            return self.sessions[session_id]
+
+    def start(self):
+        """Serve in a daemon thread and return the server"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local Stripe API stand-in')
+    parser.add_argument('--host', default='localhost', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8766, help='Port to listen on')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before each response')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Fraction of calls to fail')
+    args = parser.parse_args()
+
+    server = FakeStripeServer(args.host, args.port, args.latency, args.fail_rate)
+    print(f"Stripe stand-in listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+if __name__ == '__main__':
+    main()
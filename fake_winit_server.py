@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+"""
+Script to run a local HTTP stand-in for the Winit API
+
+Implements the actions the app uses for fulfillment (order create, confirm,
+void, query) plus warehouses, delivery methods and the product list, keeping
+orders in memory. Products are served from app/static/fallback_products.json
+(recorded getProductBaseList entries) unless --products names another file.
+Signatures are not checked. Point the app at it with:
+
+    WINIT_API_URL=http://localhost:8765/cedpopenapi/service
+
+--recordings DIR serves <action>.json files from DIR verbatim instead, e.g. a
+wanyilian.platform.queryDeliveryWay.json response captured from the live API.
+--latency adds a delay to every call, --fail-first N and --fail-rate answer
+with an error code to exercise retries, and --reject-sku makes every order
+containing that SKU fail on create and confirm.
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('fake_winit_server')
+
+DEFAULT_PRODUCTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app', 'static', 'fallback_products.json')
+
+class WinitHandler(BaseHTTPRequestHandler):
+    """Answers Winit API POSTs with the same envelope as the real service"""
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            params = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self.respond({'code': '400', 'msg': 'Invalid JSON', 'data': None})
+
+        action = params.get('action')
+        data = params.get('data') or {}
+        self.server.record(action, data)
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if self.server.should_fail():
+            return self.respond({'code': '500', 'msg': 'Temporary failure (injected)', 'data': None})
+
+        handler = self.server.actions.get(action)
+        if handler is None:
+            return self.respond({'code': '404', 'msg': f'Unknown action {action}', 'data': None})
+        self.respond(handler(data))
+
+    def respond(self, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+def ok(data=None):
+    return {'code': '0', 'msg': 'success', 'data': data}
+
+def error(msg, code='1'):
+    return {'code': code, 'msg': msg, 'data': None}
+
+class FakeWinitServer(ThreadingHTTPServer):
+    """Winit stand-in that can also be started in a background thread from tests"""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host='localhost', port=8765, latency=0.0, fail_first=0, fail_rate=0.0, reject_skus=(),
+                 products=DEFAULT_PRODUCTS, recordings=None):
+        super().__init__((host, port), WinitHandler)
+        self.latency = latency
+        self.fail_first = fail_first
+        self.fail_rate = fail_rate
+        self.reject_skus = set(reject_skus)
+        with open(products, encoding='utf-8') as f:
+            self.products = json.load(f)
+        self.orders = {}
+        self.calls = []
+        self._lock = threading.Lock()
+        self.actions = {
+            'wanyilian.distributor.order.create': self.create_order,
+            'wanyilian.distributor.order.confirm': self.confirm_orders,
+            'wanyilian.distributor.order.void': self.void_orders,
+            'wanyilian.distributor.order.queryOrder': self.query_order,
+            'wanyilian.distributor.order.queryOrderList': self.query_order_list,
+            'wanyilian.platform.queryWarehouse': lambda data: ok([{'warehouseCode': 'UKGF', 'warehouseName': 'UK GF'}]),
+            'wanyilian.platform.queryDeliveryWay': lambda data: ok([
+                {'deliveryWayID': '1001', 'deliveryWayName': 'Standard'},
+                {'deliveryWayID': '1002', 'deliveryWayName': 'Express'}
+            ]),
+            'wanyilian.supplier.spu.getProductBaseList': self.product_list,
+        }
+        if recordings:
+            self.load_recordings(recordings)
+
+    def load_recordings(self, directory):
+        """Answer every action with a <action>.json file in directory with that file"""
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith('.json'):
+                with open(os.path.join(directory, filename), encoding='utf-8') as f:
+                    recorded = json.load(f)
+                self.actions[filename[:-len('.json')]] = lambda data, recorded=recorded: recorded
+                logger.info(f"Serving recorded response for {filename[:-len('.json')]}")
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/cedpopenapi/service"
+
+    def record(self, action, data):
+        with self._lock:
+            self.calls.append((action, data))
+
+    def should_fail(self):
+        with self._lock:
+            if self.fail_first > 0:
+                self.fail_first -= 1
+                return True
+        return random.random() < self.fail_rate
+
+    def _rejected(self, order):
+        return any(product.get('productCode') in self.reject_skus for product in order['productList'])
+
+    def create_order(self, data):
+        if not data.get('productList'):
+            return error('productList is required')
+        with self._lock:
+            order_num = f"WO{len(self.orders) + 1:08d}"
+            self.orders[order_num] = {
+                'orderNum': order_num,
+                'sellerOrderNo': data.get('sellerOrderNo'),
+                'status': 'draft',
+                'trackingNo': None,
+                'productList': data['productList'],
+                'updateTime': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
+        if self._rejected(self.orders[order_num]):
+            return error(f'Order {order_num} contains a rejected SKU')
+        return ok({'orderNum': order_num})
+
+    def confirm_orders(self, data):
+        order_nums = data.get('orderNums') or []
+        with self._lock:
+            missing = [num for num in order_nums if num not in self.orders]
+            rejected = [num for num in order_nums if num in self.orders and self._rejected(self.orders[num])]
+            if missing or rejected:
+                return error(f'Cannot confirm orders: {", ".join(missing + rejected)}')
+            for num in order_nums:
+                self.set_status(num, 'confirmed')
+        return ok({'successCount': len(order_nums)})
+
+    def void_orders(self, data):
+        with self._lock:
+            for num in data.get('orderNums') or []:
+                if num in self.orders:
+                    self.set_status(num, 'voided')
+        return ok()
+
+    def query_order(self, data):
+        order = self.orders.get(data.get('orderNum'))
+        return ok(order) if order else error('Order not found')
+
+    def query_order_list(self, data):
+        page = data.get('pageParams') or {}
+        page_no, page_size = page.get('pageNo', 1), page.get('pageSize', 100)
+        with self._lock:
+            orders = sorted(self.orders.values(), key=lambda o: (o['updateTime'], o['orderNum']))
+        if data.get('updateTimeStart'):
+            orders = [o for o in orders if o['updateTime'] >= data['updateTimeStart']]
+        if data.get('sellerOrderNo'):
+            orders = [o for o in orders if o['sellerOrderNo'] == data['sellerOrderNo']]
+        start = (page_no - 1) * page_size
+        return ok({
+            'list': orders[start:start + page_size],
+            'pageParams': {'pageNo': page_no, 'pageSize': page_size, 'totalCount': len(orders)}
+        })
+
+    def product_list(self, data):
+        page = data.get('pageParams') or {}
+        page_no, page_size = page.get('pageNo', 1), page.get('pageSize', 50)
+        start = (page_no - 1) * page_size
+        return ok({
+            'SPUList': self.products[start:start + page_size],
+            'pageParams': {'pageNo': page_no, 'pageSize': page_size, 'totalCount': len(self.products)}
+        })
+
+    def set_status(self, order_num, status, tracking_no=None):
+        """Move an order to a new status, e.g. 'shipped' from a test"""
+        order = self.orders[order_num]
+        order['status'] = status
+        if tracking_no:
+            order['trackingNo'] = tracking_no
+        order['updateTime'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    def start(self):
+        """Serve in a daemon thread and return the server"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local Winit API stand-in')
+    parser.add_argument('--host', default='localhost', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before each response')
+    parser.add_argument('--fail-first', type=int, default=0, help='Fail the first N calls')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Fraction of calls to fail')
+    parser.add_argument('--reject-sku', action='append', default=[], help='Fail orders containing this SKU')
+    parser.add_argument('--products', default=DEFAULT_PRODUCTS, help='JSON list of SPUs for getProductBaseList')
+    parser.add_argument('--recordings', default=None, help='Directory of <action>.json responses to replay')
+    args = parser.parse_args()
+
+    server = FakeWinitServer(args.host, args.port, args.latency, args.fail_first, args.fail_rate, args.reject_sku,
+                             args.products, args.recordings)
+    print(f"Winit stand-in listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+if __name__ == '__main__':
+    main()
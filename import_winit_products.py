@@ -6,8 +6,10 @@ import os
 import sys
 import json
 import argparse
+import logging
 import requests
 import re
+from contextlib import nullcontext
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 from dotenv import load_dotenv
@@ -208,12 +210,17 @@ def main():
     parser.add_argument('--details', action='store_true', help='Fetch detailed product information by visiting product pages')
     parser.add_argument('--output', type=str, help='Output file for product data (optional)')
     parser.add_argument('--dry-run', action='store_true', help='Don\'t save to database, just print info')
+    parser.add_argument('--profile-sql', action='store_true', help='Print a SQL query report (query counts, N+1 suspects) at the end')
     args = parser.parse_args()
+
+    if args.profile_sql:
+        logging.basicConfig(level=logging.INFO, format='%(message)s')
     
     # Import the Flask app
     try:
         from app import create_app, db
         from app.models import WinitProduct
+        from app.sql_profiler import profile_queries
         app = create_app()
     except ImportError:
         print("Error: Could not import the Flask app. Make sure you're in the correct directory.")
@@ -224,7 +231,7 @@ def main():
     product_count = 0
     
     # Fetch products from the homepage
-    with app.app_context():
+    with app.app_context(), profile_queries('import_winit_products') if args.profile_sql else nullcontext():
         print(f"Fetching products from homepage at {args.url}...")
         
         # Fetch products page by page
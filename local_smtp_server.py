@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+"""
+Script to run a local SMTP stand-in for development and tests
+
+Accepts mail over plain SMTP (any AUTH credentials are accepted), writes each
+message to --maildir as an .eml file and logs the envelope. Point the app at
+it with:
+
+    MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_USE_TLS=false
+
+--fail-first N rejects the first N messages with a temporary 451 error and
+--fail-rate rejects a random fraction, to exercise outbox retries.
+"""
+import os
+import sys
+import random
+import logging
+import argparse
+import threading
+import socketserver
+from datetime import datetime
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('local_smtp_server')
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough SMTP for smtplib and Flask-Mail"""
+
+    def reply(self, line):
+        self.wfile.write((line + '\r\n').encode('utf-8'))
+
+    def handle(self):
+        server = self.server
+        self.reply('220 localhost local SMTP stand-in ready')
+        mail_from, rcpt_to = None, []
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+
+            if verb == 'EHLO':
+                self.reply('250-localhost')
+                self.reply('250-AUTH PLAIN LOGIN')
+                self.reply('250 8BITMIME')
+            elif verb == 'HELO':
+                self.reply('250 localhost')
+            elif verb == 'AUTH':
+                parts = command.split()
+                if len(parts) == 2 and parts[1].upper() == 'LOGIN':
+                    # Username and password prompts; the values are ignored
+                    self.reply('334 VXNlcm5hbWU6')
+                    self.rfile.readline()
+                    self.reply('334 UGFzc3dvcmQ6')
+                    self.rfile.readline()
+                self.reply('235 Authentication successful')
+            elif verb == 'MAIL':
+                mail_from, rcpt_to = command[10:].strip(), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                rcpt_to.append(command[8:].strip())
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line in (b'.\r\n', b'.\n'):
+                        break
+                    # Undo dot-stuffing
+                    data.append(data_line[1:] if data_line.startswith(b'..') else data_line)
+                if server.should_fail():
+                    self.reply('451 Temporary failure (injected)')
+                else:
+                    path = server.store(mail_from, rcpt_to, b''.join(data))
+                    self.reply(f'250 OK queued as {os.path.basename(path)}')
+                mail_from, rcpt_to = None, []
+            elif verb == 'RSET':
+                mail_from, rcpt_to = None, []
+                self.reply('250 OK')
+            elif verb == 'NOOP':
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    """SMTP stand-in that can also be started in a background thread from tests"""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host='localhost', port=1025, maildir='maildir', fail_first=0, fail_rate=0.0):
+        super().__init__((host, port), SMTPHandler)
+        self.maildir = maildir
+        self.fail_first = fail_first
+        self.fail_rate = fail_rate
+        self.messages = []
+        self._lock = threading.Lock()
+        os.makedirs(maildir, exist_ok=True)
+
+    def should_fail(self):
+        with self._lock:
+            if self.fail_first > 0:
+                self.fail_first -= 1
+                return True
+        return random.random() < self.fail_rate
+
+    def store(self, mail_from, rcpt_to, data):
+        with self._lock:
+            self.messages.append({'from': mail_from, 'to': rcpt_to, 'data': data})
+            name = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{len(self.messages):05d}.eml"
+        path = os.path.join(self.maildir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        logger.info(f"Accepted message from {mail_from} to {', '.join(rcpt_to)} ({len(data)} bytes) -> {path}")
+        return path
+
+    def start(self):
+        """Serve in a daemon thread and return the server"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local SMTP stand-in')
+    parser.add_argument('--host', default='localhost', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=1025, help='Port to listen on')
+    parser.add_argument('--maildir', default='maildir', help='Directory to write received messages to')
+    parser.add_argument('--fail-first', type=int, default=0, help='Reject the first N messages with 451')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Fraction of messages to reject with 451')
+    args = parser.parse_args()
+
+    server = LocalSMTPServer(args.host, args.port, args.maildir, args.fail_first, args.fail_rate)
+    print(f"Local SMTP stand-in listening on {args.host}:{args.port}, writing to {args.maildir}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+if __name__ == '__main__':
+    main()
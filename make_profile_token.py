@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+"""
+Script to mint a token that profiles the requests carrying it
+
+The token is signed with the app's SECRET_KEY and accepted for
+PROFILER_TOKEN_MAX_AGE seconds by servers running with PROFILER_ENABLED=true:
+
+    curl -H "X-Profile: $(python make_profile_token.py -q)" https://locoganga.com/
+    https://locoganga.com/checkout/?_profile=<token>
+
+The collapsed stacks land in LOG_DIR/profiles; the X-Profile-File response
+header names the file.
+"""
+import os
+import sys
+import argparse
+
+# Add the current directory to the path so we can import the app
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from config import Config
+from app.profiler import make_token
+
+def main():
+    parser = argparse.ArgumentParser(description='Mint a request profiling token')
+    parser.add_argument('--note', default='', help='Text logged with every profile taken with this token')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Print only the token')
+    args = parser.parse_args()
+
+    token = make_token(Config.SECRET_KEY, args.note)
+    if args.quiet:
+        print(token)
+        return
+    print(f"Token (valid for {Config.PROFILER_TOKEN_MAX_AGE}s):\n{token}\n")
+    print("Send it as the X-Profile header or the _profile query argument, e.g.")
+    print(f"  curl -H 'X-Profile: {token}' http://localhost:5000/")
+
+if __name__ == '__main__':
+    main()
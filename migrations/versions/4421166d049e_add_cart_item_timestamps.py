@@ -0,0 +1,40 @@
+"""add cart item timestamps
+
+Revision ID: 4421166d049e
+Revises: 6966b49de3f1
+Create Date: 2026-10-19 11:40:02.518391
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4421166d049e'
+down_revision = '6966b49de3f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('cart_item', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('created_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_cart_item_updated_at'), ['updated_at'], unique=False)
+
+    # Existing carts start their expiry clock now rather than being purged at once
+    cart_item = sa.table(
+        'cart_item',
+        sa.column('created_at', sa.DateTime),
+        sa.column('updated_at', sa.DateTime),
+    )
+    now = datetime.utcnow()
+    op.execute(cart_item.update().values(created_at=now, updated_at=now))
+
+
+def downgrade():
+    with op.batch_alter_table('cart_item', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_cart_item_updated_at'))
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('created_at')
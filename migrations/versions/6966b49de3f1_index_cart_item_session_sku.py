@@ -0,0 +1,57 @@
+"""index cart item session and sku
+
+Revision ID: 6966b49de3f1
+Revises: 16e1061c5c3e
+Create Date: 2026-10-19 09:12:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6966b49de3f1'
+down_revision = '16e1061c5c3e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Concurrent "add to cart" clicks could previously create duplicate
+    # (session_id, sku) rows. Fold them into the lowest id before the unique
+    # index is built, otherwise the index creation fails.
+    conn = op.get_bind()
+    cart_item = sa.table(
+        'cart_item',
+        sa.column('id', sa.Integer),
+        sa.column('session_id', sa.String),
+        sa.column('sku', sa.String),
+        sa.column('quantity', sa.Integer),
+    )
+    duplicates = conn.execute(
+        sa.select(cart_item.c.session_id, cart_item.c.sku)
+        .group_by(cart_item.c.session_id, cart_item.c.sku)
+        .having(sa.func.count() > 1)
+    ).fetchall()
+    for session_id, sku in duplicates:
+        rows = conn.execute(
+            sa.select(cart_item.c.id, cart_item.c.quantity)
+            .where(cart_item.c.session_id == session_id, cart_item.c.sku == sku)
+            .order_by(cart_item.c.id)
+        ).fetchall()
+        keep_id = rows[0][0]
+        quantity = sum(row[1] or 0 for row in rows)
+        conn.execute(
+            cart_item.update().where(cart_item.c.id == keep_id).values(quantity=quantity)
+        )
+        conn.execute(
+            cart_item.delete().where(cart_item.c.id.in_([row[0] for row in rows[1:]]))
+        )
+
+    with op.batch_alter_table('cart_item', schema=None) as batch_op:
+        batch_op.create_index('ix_cart_item_session_id_sku', ['session_id', 'sku'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('cart_item', schema=None) as batch_op:
+        batch_op.drop_index('ix_cart_item_session_id_sku')
@@ -0,0 +1,67 @@
+"""add winit products
+
+Revision ID: 79ce95a4d6d8
+Revises: 0f4a6c8e2b91
+Create Date: 2026-10-19 19:58:21.406733
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '79ce95a4d6d8'
+down_revision = '0f4a6c8e2b91'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases set up with create_db_direct.py or create_tables.py already
+    # have this table (same columns and index names); keep it and only add
+    # what is missing, so no `alembic stamp` is needed
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table('winit_products'):
+        existing = {index['name'] for index in inspector.get_indexes('winit_products')}
+        with op.batch_alter_table('winit_products', schema=None) as batch_op:
+            if 'ix_winit_products_sku' not in existing:
+                batch_op.create_index(batch_op.f('ix_winit_products_sku'), ['sku'], unique=False)
+            if 'ix_winit_products_spu' not in existing:
+                batch_op.create_index(batch_op.f('ix_winit_products_spu'), ['spu'], unique=True)
+        return
+
+    op.create_table('winit_products',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('spu', sa.String(length=50), nullable=True),
+    sa.Column('sku', sa.String(length=50), nullable=True),
+    sa.Column('name', sa.String(length=200), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('price', sa.Float(), nullable=True),
+    sa.Column('stock', sa.Integer(), nullable=True),
+    sa.Column('image_url', sa.String(length=500), nullable=True),
+    sa.Column('thumbnail_url', sa.String(length=500), nullable=True),
+    sa.Column('category', sa.String(length=100), nullable=True),
+    sa.Column('brand', sa.String(length=100), nullable=True),
+    sa.Column('weight', sa.Float(), nullable=True),
+    sa.Column('dimensions', sa.String(length=100), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('additional_data', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('winit_products', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_winit_products_sku'), ['sku'], unique=False)
+        batch_op.create_index(batch_op.f('ix_winit_products_spu'), ['spu'], unique=True)
+
+    # ### end Alembic commands ###
+
+
+def downgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('winit_products', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_winit_products_spu'))
+        batch_op.drop_index(batch_op.f('ix_winit_products_sku'))
+
+    op.drop_table('winit_products')
+    # ### end Alembic commands ###
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+"""
+Script to send signed Stripe webhook events to a local server
+
+Builds a checkout.session.completed event (or any --type), signs it with the
+local webhook secret the same way Stripe does and posts it to the webhook
+endpoint. Run the app with the same secret:
+
+    STRIPE_WEBHOOK_SECRET=whsec_local_test flask run
+    python send_test_webhook.py --cart-session-id <cart id> --repeat 3
+
+--repeat re-sends the identical event, as Stripe does on retries, to check
+that duplicates are acknowledged without being processed twice.
+"""
+import os
+import sys
+import hmac
+import json
+import time
+import uuid
+import hashlib
+import logging
+import argparse
+import requests
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('send_test_webhook')
+
+DEFAULT_SECRET = 'whsec_local_test'
+
+def sign_payload(payload, secret, timestamp=None):
+    """
+    Build a Stripe-Signature header for payload
+
+    Args:
+        payload (str): Exact request body
+        secret (str): Webhook signing secret
+        timestamp (int): Signing time (default: now)
+
+    Returns:
+        str: Header value in Stripe's t=...,v1=... format
+    """
+    timestamp = int(timestamp or time.time())
+    signed = f"{timestamp}.{payload}".encode('utf-8')
+    signature = hmac.new(secret.encode('utf-8'), signed, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+def make_event(event_type, checkout_session_id, cart_session_id, email):
+    """Build a minimal Stripe event shaped like the ones the app handles"""
+    return {
+        'id': f"evt_local_{uuid.uuid4().hex}",
+        'object': 'event',
+        'type': event_type,
+        'created': int(time.time()),
+        'data': {
+            'object': {
+                'id': checkout_session_id,
+                'object': 'checkout.session',
+                'payment_status': 'paid',
+                'metadata': {'cart_session_id': cart_session_id} if cart_session_id else {},
+                'customer_details': {'email': email, 'phone': None},
+                'shipping_details': {
+                    'name': 'Local Test',
+                    'address': {
+                        'line1': '1 Test Street',
+                        'line2': None,
+                        'city': 'London',
+                        'state': None,
+                        'postal_code': 'E1 6AN',
+                        'country': 'GB'
+                    }
+                }
+            }
+        }
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Send signed Stripe webhook events to a local server')
+    parser.add_argument('--url', default='http://localhost:5000/checkout/webhook', help='Webhook endpoint')
+    parser.add_argument('--secret', default=os.environ.get('STRIPE_WEBHOOK_SECRET') or DEFAULT_SECRET,
+                        help='Webhook signing secret')
+    parser.add_argument('--type', default='checkout.session.completed', help='Event type')
+    parser.add_argument('--session-id', default=None, help='Checkout session id (default: random)')
+    parser.add_argument('--cart-session-id', default=None, help='Cart session id stored in the metadata')
+    parser.add_argument('--email', default='customer@example.com', help='Customer email')
+    parser.add_argument('--repeat', type=int, default=1, help='Times to deliver the same event')
+    args = parser.parse_args()
+
+    event = make_event(args.type, args.session_id or f"cs_local_{uuid.uuid4().hex}",
+                       args.cart_session_id, args.email)
+    payload = json.dumps(event)
+
+    for attempt in range(args.repeat):
+        start = time.perf_counter()
+        response = requests.post(args.url, data=payload, timeout=10, headers={
+            'Content-Type': 'application/json',
+            'Stripe-Signature': sign_payload(payload, args.secret)
+        })
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"{event['id']} delivery {attempt + 1}: HTTP {response.status_code} "
+                    f"in {elapsed_ms:.1f} ms: {response.text.strip()}")
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
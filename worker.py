@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+"""
+Script to run background maintenance jobs
+
+Each job can run once (e.g. from cron) or stay resident with --loop, which
+is how locoganga.ini attaches them to uWSGI.
+
+    python worker.py compact-carts
+    python worker.py compact-carts --loop --interval 900
+    python worker.py send-emails --loop
+    python worker.py finalize-orders --loop
+    python worker.py process-webhooks --loop
+    python worker.py fulfill-orders --loop      # needs WINIT_FULFILLMENT_ENABLED=true
+    python worker.py sync-tracking --loop
+    python worker.py replica-heartbeat --loop
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+from dotenv import load_dotenv
+
+# Add the current directory to the path so we can import the app
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('worker')
+
+def compact_carts(args):
+    """Delete abandoned carts and checkout snapshots in bounded batches"""
+    from flask import current_app
+    from app.services.cart_service import CartService
+    from app.services.order_service import OrderService
+
+    started = time.time()
+    reclaimed = CartService().compact_expired(batch_size=args.batch_size, pause=args.pause)
+    reclaimed += OrderService().prune_checkout_snapshots(
+        current_app.config['CART_TTL_SECONDS'], batch_size=args.batch_size or current_app.config['CART_COMPACTION_BATCH_SIZE'])
+    logger.info(f"compact-carts reclaimed {reclaimed} rows in {time.time() - started:.2f}s")
+    return reclaimed
+
+def send_emails(args):
+    """Send due emails from the outbox"""
+    from app.services.email_outbox import EmailOutboxWorker
+
+    stats = EmailOutboxWorker().drain(batch_size=args.batch_size)
+    if any(stats.values()):
+        logger.info(f"send-emails sent {stats['sent']}, retried {stats['retried']}, failed {stats['failed']}")
+    return stats
+
+def finalize_orders(args):
+    """Finalize paid checkout sessions queued by the webhook or success page"""
+    from app.services.order_service import OrderService
+
+    stats = OrderService().process_pending(batch_size=args.batch_size or 20)
+    if any(stats.values()):
+        logger.info(f"finalize-orders finalized {stats['finalized']}, retried {stats['retried']}, failed {stats['failed']}")
+    return stats
+
+def process_webhooks(args):
+    """Handle stored Stripe webhook events in order"""
+    from app.services.webhook_service import WebhookService
+
+    stats = WebhookService().process_pending(batch_size=args.batch_size or 50)
+    if any(stats.values()):
+        logger.info(f"process-webhooks processed {stats['processed']}, retried {stats['retried']}, failed {stats['failed']}")
+    return stats
+
+def fulfill_orders(args):
+    """Submit paid orders to Winit"""
+    from app.services.fulfillment_service import FulfillmentService
+
+    stats = FulfillmentService().process_batch(batch_size=args.batch_size)
+    if stats['claimed']:
+        logger.info(f"fulfill-orders submitted {stats['submitted']}/{stats['claimed']} "
+                    f"(created {stats['created']}, retried {stats['retried']}, failed {stats['failed']}) "
+                    f"in {stats['seconds']:.2f}s, {stats['throughput']:.1f} orders/s, "
+                    f"failure rate {stats['failure_rate']:.0%}, lag max {stats['max_lag']:.0f}s avg {stats['avg_lag']:.0f}s")
+    return stats
+
+def sync_tracking(args):
+    """Pull order status and tracking updates from Winit"""
+    from app.services.tracking_service import TrackingSyncService
+
+    stats = TrackingSyncService().sync(page_size=args.batch_size)
+    if stats['updated']:
+        logger.info(f"sync-tracking updated {stats['updated']} of {stats['seen']} orders in {stats['pages']} page(s) "
+                    f"({stats['shipped']} shipped, {stats['cancelled']} cancelled), cursor {stats['cursor']}")
+    return stats
+
+def replica_heartbeat(args):
+    """Stamp the heartbeat the replica lag check reads (app/replica.py)"""
+    from flask import current_app
+    from app.replica import write_heartbeat
+
+    if 'replica_router' not in current_app.extensions:
+        return None
+    return write_heartbeat()
+
+# name: (job, default loop interval in seconds, help)
+JOBS = {
+    'compact-carts': (compact_carts, 900, 'Delete abandoned carts'),
+    'send-emails': (send_emails, 5, 'Send queued emails from the outbox'),
+    'finalize-orders': (finalize_orders, 1, 'Finalize paid checkout sessions'),
+    'process-webhooks': (process_webhooks, 1, 'Handle stored Stripe webhook events'),
+    'fulfill-orders': (fulfill_orders, 10, 'Submit paid orders to Winit'),
+    'sync-tracking': (sync_tracking, 300, 'Pull order status and tracking updates from Winit'),
+    'replica-heartbeat': (replica_heartbeat, 5, 'Stamp the read-replica lag heartbeat (no-op without a replica)'),
+}
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run background maintenance jobs',
+        epilog='jobs: ' + '; '.join(f"{name}: {info[2]}" for name, info in sorted(JOBS.items()))
+    )
+    parser.add_argument('job', choices=sorted(JOBS), help='Job to run')
+    parser.add_argument('--loop', action='store_true', help='Keep running the job every --interval seconds')
+    parser.add_argument('--interval', type=float, help='Seconds between runs in --loop mode')
+    parser.add_argument('--batch-size', type=int, help='Rows handled per batch (job default if omitted)')
+    parser.add_argument('--pause', type=float, default=0.05, help='Seconds to sleep between batches')
+    parser.add_argument('--profile-sql', action='store_true', help='Log a SQL query report after each run')
+    args = parser.parse_args()
+
+    job, default_interval, _ = JOBS[args.job]
+    interval = args.interval or default_interval
+
+    # Before config.py is read: the jobs get a small fixed pool, not a web worker's share
+    os.environ['DB_POOL_BACKGROUND'] = 'true'
+    from app import create_app, db
+    from app.sql_profiler import profile_queries
+    app = create_app()
+
+    switch = app.config['WORKER_JOB_SWITCHES'].get(args.job)
+    if switch and not app.config.get(switch):
+        logger.info(f"{args.job} is off until {switch} is set")
+        # An attached daemon that exits is respawned by uWSGI, so idle instead
+        while args.loop:
+            time.sleep(3600)
+        return
+
+    with app.app_context():
+        while True:
+            try:
+                if args.profile_sql:
+                    with profile_queries(args.job, app.config['SQL_PROFILER_N_PLUS_ONE_THRESHOLD'], logger):
+                        job(args)
+                else:
+                    job(args)
+            except Exception as e:
+                logger.exception(f"{args.job} failed: {e}")
+                if not args.loop:
+                    sys.exit(1)
+            finally:
+                db.session.remove()
+
+            if not args.loop:
+                break
+            time.sleep(interval)
+
+if __name__ == '__main__':
+    main()
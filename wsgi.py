@@ -1,7 +1,9 @@
 from app import create_app
+from app.warmup import prepare_uwsgi
 
 app = create_app()
+# Under uWSGI: warm up in the master before fork, reset pools in each worker
+prepare_uwsgi(app)
 
 if __name__ == "__main__":
     app.run()
-